@@ -1,15 +1,26 @@
 """
 PianoRay module.
+
+``effects`` and ``render`` import OpenCV and mido, so they are imported on
+first access (e.g. ``pianoray.render``) instead of with the package.
 """
 
 import os
 os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "hide"
 del os
 
-from . import effects
-from . import render
+import importlib
+
 from . import utils
 
 from .api import *
 
 __version__ = utils.VERSION
+
+_LAZY_MODULES = ("effects", "render")
+
+
+def __getattr__(name):
+    if name in _LAZY_MODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -13,8 +13,8 @@ from . import logger
 from .api import import_scene
 from .utils import VERSION
 
-from .render import render_video
-from .view import view_video
+# Subcommands import their modules when run, so e.g. rendering doesn't
+# import pygame, and --version imports neither OpenCV nor pygame.
 
 
 def render(args):
@@ -22,6 +22,8 @@ def render(args):
     Call this when the user requests render, e.g.
     pianoray render ...
     """
+    from .render import render_video
+
     if args.output.exists() and not args.yes:
         if input(f"Overwrite output file {args.output}? [y/N] ") \
                 .lower().strip() != "y":
@@ -41,6 +43,8 @@ def view(args):
     Called when the user requests view e.g.
     pianoray view ...
     """
+    from .view import view_video
+
     view_video(args.file)
 
 
@@ -72,6 +76,74 @@ def main():
         help="Open output file after rendering")
     render_parser.add_argument("-r", "--resume", type=literal_eval,
         help="Whether to resume previous render (omit for prompt).")
+    render_parser.add_argument("-j", "--jobs", type=int, default=1,
+        help="Number of processes to render frames in (default 1).")
+    render_parser.add_argument("-t", "--threads", type=int,
+        help="Number of threads rendering each frame, 0 for all cores "
+             "(default: the scene's video.threads).")
+    render_parser.add_argument("--save-frames", action="store_true",
+        help="Save frames to the cache instead of streaming to FFmpeg.")
+    render_parser.add_argument("--draft", action="store_true",
+        help="Quickly render a low quality preview.")
+    render_parser.add_argument("--draft-scale", type=float, default=0.25,
+        help="Resolution multiplier of draft render (default 0.25).")
+    render_parser.add_argument("--draft-stride", type=int, default=2,
+        help="Render every Nth frame in draft render (default 2).")
+    window = render_parser.add_mutually_exclusive_group()
+    window.add_argument("--frames", metavar="START:END",
+        help="Only render video frames START (inclusive) to END (exclusive). "
+             "Either can be omitted. Frame 0 is the first frame of the video.")
+    window.add_argument("--seconds", metavar="START:END",
+        help="Like --frames, in seconds of the video.")
+    render_parser.add_argument("--join", type=Path, nargs="+", metavar="VIDEO",
+        help="Join videos rendered with --frames or --seconds, in order, "
+             "and add audio. Nothing is rendered.")
+    render_parser.add_argument("--encoders", type=int, default=1,
+        help="Number of video segments to encode concurrently (default 1).")
+    render_parser.add_argument("--precision", default="float64",
+        choices=("float64", "float32"),
+        help="Precision of the raw image (default float64). float32 uses "
+        "half the memory bandwidth.")
+    render_parser.add_argument("--check-precision", action="store_true",
+        help="Also render each frame in float64 and report the max pixel "
+        "difference. Slow.")
+    render_parser.add_argument("--profile", type=Path,
+        help="Time each stage of each frame. Saves a Chrome trace (JSON) to "
+        "this path and a table of times next to it.")
+    render_parser.add_argument("--frame-cache", type=int, default=0,
+        help="Cache rendered frames to reuse when rendering again, with this "
+             "max size in MB (default 0, disabled).")
+    render_parser.add_argument("--farm", type=Path,
+        help="Render as a node of a render farm in this shared directory.")
+    render_parser.add_argument("--farm-chunk", type=float, default=10,
+        help="Seconds of video per farm chunk (default 10).")
+    render_parser.add_argument("--farm-lease", type=float, default=120,
+        help="Seconds until the lease of an unresponsive node expires "
+             "(default 120).")
+
+    bench_parser = subparsers.add_parser("bench",
+        help="Benchmark rendering with synthetic MIDI files.")
+    bench_parser.add_argument("-c", "--cache", type=Path, default=".prcache",
+        help="Path to cache directory.")
+    bench_parser.add_argument("-o", "--output", type=Path,
+        help="Save results to this JSON file.")
+    bench_parser.add_argument("-b", "--baseline", type=Path,
+        help="Compare results to this JSON file, and fail if any regressed. "
+             "Saved here if it doesn't exist.")
+    bench_parser.add_argument("--update", action="store_true",
+        help="Overwrite the baseline with the results.")
+    bench_parser.add_argument("--threshold", type=float, default=0.1,
+        help="Fraction a result may be worse than the baseline "
+             "(default 0.1).")
+    bench_parser.add_argument("--workloads",
+        help="Comma separated workloads (default all).")
+    bench_parser.add_argument("--resolutions",
+        help="Comma separated resolutions (default 640x360,1280x720,"
+             "1920x1080).")
+    bench_parser.add_argument("--frames", type=int, default=150,
+        help="Frames to render of each case (default 150).")
+    bench_parser.add_argument("-j", "--jobs", type=int, default=1,
+        help="Number of processes to render with.")
 
     view_parser = subparsers.add_parser("view",
         help="View a video file in a GUI video.")
@@ -82,6 +154,9 @@ def main():
 
     if args.subparser == "render":
         render(args)
+    elif args.subparser == "bench":
+        from .bench import bench
+        return bench(args)
     elif args.subparser == "view":
         view(args)
     else:
@@ -5,3 +5,4 @@ from .modifiers import Modifier, Coords
 from .pgroup import PropertyGroup
 from .props import *
 from .scene import Scene
+from .timeline import Timeline
@@ -37,6 +37,15 @@ class VideoProps(PropertyGroup):
         default="libx265",
     )
 
+    threads: IntProp(
+        name="Threads",
+        desc="Threads the C kernels use to render each frame, 0 for all "
+             "cores. Doesn't change the output.",
+        animatable=False,
+        default=1,
+        min=0,
+    )
+
 
 class AudioProps(PropertyGroup):
     """
@@ -113,6 +122,13 @@ class CompositingProps(PropertyGroup):
         min=0,
     )
 
+    tone_curve: StrProp(
+        name="Tone Curve",
+        desc="Curve mapping brightness to colors: tanh, reinhard or aces.",
+        animatable=False,
+        default="tanh",
+    )
+
 
 class PianoProps(PropertyGroup):
     """
@@ -1,28 +1,28 @@
-from typing import Any
+from typing import Any, Sequence
 
 import numpy as np
 
 from .keyframe import Keyframe, Interp
 
 
-def lerp(fac, from_range, to_range) -> Any:
-    """
-    Linear interpolation, similar to np.interp
-    Works on np.array as well.
-    """
-    progress = (fac-from_range[0]) / (from_range[1]-from_range[0])
-    return to_range[0] + progress * (to_range[1]-to_range[0])
-
-
 def quad_fac(fac):
     """
     if fac < 0.5: y = 2x^2
     else: y = -2(x-1)^2 + 1
     """
+    # Squares as products, so quad_fac_array gives identical results.
     if fac < 0.5:
-        return 2 * fac**2
+        return 2 * (fac*fac)
     else:
-        return -2 * (fac-1)**2 + 1
+        return -2 * ((fac-1)*(fac-1)) + 1
+
+
+def quad_fac_array(fac: np.ndarray) -> np.ndarray:
+    """
+    quad_fac of each element.
+    """
+    return np.where(fac < 0.5, 2 * (fac*fac), -2 * ((fac-1)*(fac-1)) + 1)
+
 
 def interpolate(k1: Keyframe, k2: Keyframe, frame: int) -> Any:
     """
@@ -39,8 +39,57 @@ def interpolate(k1: Keyframe, k2: Keyframe, frame: int) -> Any:
         return v1
 
     elif interp in (Interp.LINEAR, Interp.QUADRATIC):
-        fac = np.interp(frame, (f1, f2), (0, 1))  # Lerp
+        # Same operations as np.interp(frame, (f1, f2), (0, 1))
+        fac = (1/(f2-f1)) * (frame-f1)
         if interp == Interp.QUADRATIC:
             fac = quad_fac(fac)
 
-        return lerp(fac, (0, 1), (v1, v2))
+        return v1 + fac*(v2-v1)
+
+
+def interpolate_array(keys: Sequence[Keyframe], frames: np.ndarray) \
+        -> np.ndarray:
+    """
+    Values of keyframes at many frames at once, identical to
+    ``Property._get_value`` of each frame.
+    Values before the first and after the last keyframe are held.
+
+    :param keys: At least two keyframes, sorted by frame.
+    :param frames: 1D array of frames.
+    :return: Array of shape ``(len(frames), *value shape)``.
+    """
+    n = len(keys)
+    key_frames = np.array([k.frame for k in keys])
+    values = np.array([k.value for k in keys])
+    interps = np.array([k.interp for k in keys])
+
+    first = frames <= key_frames[0]
+    last = (frames >= key_frames[-1]) & ~first
+    # The first keyframe at or after each frame, like bisect_left.
+    i = np.clip(np.searchsorted(key_frames, frames, side="left"), 1, n-1)
+    exact = key_frames[i] == frames
+    between = ~(first | last | exact)
+
+    # Keyframe whose value is held: exact matches and constant interps.
+    src = np.where(first, 0, np.where(last, n-1, np.where(between, i-1, i)))
+    out = values[src]
+
+    i = i[between]
+    interp = interps[i-1]
+    smooth = interp != Interp.CONSTANT
+    if not smooth.any():
+        return out
+
+    i = i[smooth]
+    interp = interp[smooth]
+    f1, f2 = key_frames[i-1], key_frames[i]
+    # Same operations as interpolate
+    fac = (1/(f2-f1)) * (frames[between][smooth]-f1)
+    fac = np.where(interp == Interp.QUADRATIC, quad_fac_array(fac), fac)
+
+    v1, v2 = values[i-1], values[i]
+    fac = fac.reshape(-1, *[1]*(values.ndim-1))
+    rows = np.flatnonzero(between)[smooth]
+    out = out.astype(np.result_type(out, float))
+    out[rows] = v1 + fac*(v2-v1)
+    return out
@@ -10,7 +10,11 @@ class Modifier:
     to dim colors (a Dim modifier).
 
     Base class modifier does nothing.
+
+    Set ``vectorized`` if the modifier gives the same results when called
+    with an array of values of many frames (see ``Property.value_array``).
     """
+    vectorized: bool = False
 
     def __init__(self):
         pass
@@ -29,6 +33,7 @@ class Coords(Modifier):
     """
     Modifier from coords value to pixel value.
     """
+    vectorized = True
 
     def __call__(self, default, value):
         coord = default.video.resolution[0] / 52
@@ -39,6 +44,7 @@ class SecToFrame(Modifier):
     """
     Convert seconds to frames.
     """
+    vectorized = True
 
     def __call__(self, default, value):
         return value / default.video.fps
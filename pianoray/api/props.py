@@ -1,11 +1,12 @@
 import os
+from bisect import bisect_left, bisect_right
 from typing import Any, Iterable, List, Optional, Sequence, Tuple, Type
 
 import numpy as np
 
 from .accessor import Accessor
 from .keyframe import Keyframe, Interp
-from .interpolate import interpolate
+from .interpolate import interpolate, interpolate_array
 from .modifiers import Modifier
 
 __all__ = (
@@ -34,9 +35,13 @@ class Property:
     mods: Sequence[Modifier]
     default: Any
 
-    _keyframes: List[Keyframe]
+    _keyframes: List[Keyframe]  # Sorted by frame
+    _frames: List[int]  # Frames of _keyframes, for bisect
     _value: Any
 
+    # Incremented whenever any property's value or keyframes change.
+    _version: int = 0
+
     def __init__(self, name: str = "", desc: str = "", animatable: bool = True,
             required: bool = True, mods: Sequence[Modifier] = (),
             default: Optional[Any] = None):
@@ -59,6 +64,7 @@ class Property:
         self.default = default if default is None else self.type(default)
 
         self._keyframes = []
+        self._frames = []
         self._value = None
 
         if self.default is not None:
@@ -71,6 +77,7 @@ class Property:
         value = self.type(value)
         assert self.verify(value)
         self._value = value
+        Property._version += 1
 
     def animate(self, *args) -> None:
         """
@@ -103,7 +110,20 @@ class Property:
         for k in keyframes:
             k.value = self.type(k.value)
         assert all(self.verify(k.value) for k in keyframes)
-        self._keyframes.extend(keyframes)
+        for k in keyframes:
+            # After keyframes on the same frame, like a stable sort.
+            i = bisect_right(self._frames, k.frame)
+            self._frames.insert(i, k.frame)
+            self._keyframes.insert(i, k)
+        Property._version += 1
+
+    @property
+    def animated(self) -> bool:
+        """
+        Whether the value can differ between frames, i.e. there are at
+        least two keyframes.
+        """
+        return len(self._keyframes) > 1
 
     def verify(self, value: Any) -> bool:
         """
@@ -123,7 +143,7 @@ class Property:
         Call ``self.value(frame)`` instead to convert to the prop's type and
         apply modifiers.
         """
-        keys = sorted(self._keyframes)
+        keys = self._keyframes
 
         if len(keys) == 0:
             if self._value is None:
@@ -144,15 +164,11 @@ class Property:
             elif frame >= keys[-1].frame:
                 return keys[-1].value
             else:
-                for i, k in enumerate(keys):
-                    if k.frame == frame:
-                        return k.value
-                    if k.frame > frame:
-                        break
+                i = bisect_left(self._frames, frame)
+                if self._frames[i] == frame:
+                    return keys[i].value
 
-                k1 = keys[i-1]
-                k2 = keys[i]
-                return interpolate(k1, k2, frame)
+                return interpolate(keys[i-1], keys[i], frame)
 
     def value(self, frame: int, use_mods: bool = True,
             default: Optional[Accessor] = None) -> Any:
@@ -166,6 +182,32 @@ class Property:
                 v = m(default, v)
         return v
 
+    def value_array(self, frames: np.ndarray, use_mods: bool = True,
+            default: Optional[Accessor] = None) -> np.ndarray:
+        """
+        Values at many frames at once, equal to ``self.value`` of each
+        frame. Keyframes are interpolated vectorized, and modifiers are
+        applied to the whole array if they are all ``vectorized``;
+        otherwise every frame is evaluated separately.
+
+        :param frames: 1D array of frames.
+        :return: Array of shape ``(len(frames), *value shape)``.
+        """
+        frames = np.asarray(frames)
+        if use_mods and not all(m.vectorized for m in self.mods):
+            return np.array([self.value(f, True, default)
+                for f in frames.tolist()])
+
+        if len(self._keyframes) > 1:
+            raw = interpolate_array(self._keyframes, frames).tolist()
+        else:
+            raw = [self._get_value(0)] * len(frames)
+        v = np.array([self.type(x) for x in raw])
+        if use_mods:
+            for m in self.mods:
+                v = m(default, v)
+        return v
+
 
 class BoolProp(Property):
     """
@@ -1,7 +1,11 @@
-from typing import Any, Mapping, Type
+from typing import Any, List, Mapping, Tuple, Type
+
+import numpy as np
 
 from .accessor import Accessor
 from .pgroup import PropertyGroup
+from .props import Property
+from .timeline import Timeline
 
 
 class Scene:
@@ -44,13 +48,25 @@ class Scene:
     def values(self, frame: int, use_mods: bool = True) -> Accessor:
         """
         Returns Accesor object of all pgroup values at frame.
+
+        With ``use_mods``, only animated props are evaluated; the others
+        are shared between frames (see ``_frozen``) and must not be
+        modified.
         """
-        default = self.values(0, False) if use_mods else None
+        if not use_mods:
+            return self._evaluate(frame, False)
 
+        frozen = self._frozen()
         ret = {}
-        for k, pgroup in self._pgroups.items():
-            v = pgroup._values(frame, use_mods, default)
-            ret[k] = v
+        for k, static in frozen.static.items():
+            animated = frozen.animated.get(k)
+            if animated is None:
+                ret[k] = static
+            else:
+                values = static._attrs.copy()
+                for name, prop in animated:
+                    values[name] = prop.value(frame, True, frozen.raw)
+                ret[k] = Accessor(values)
 
         return Accessor(ret)
 
@@ -59,10 +75,74 @@ class Scene:
         """
         Equivalent to ``self.values(0)``.
         Usually used to get non animatable props.
+        Computed once until a prop changes.
         """
-        return self.values(0)
+        return self._frozen().default
+
+    def bake(self, frame_start: int, frame_end: int) -> Timeline:
+        """
+        Evaluate animated props on every frame in
+        ``[frame_start, frame_end)`` at once.
+        ``timeline.values(frame)`` is then equal to ``self.values(frame)``.
+        """
+        return Timeline.bake(self, frame_start, frame_end)
+
+    def _evaluate(self, frame: int, use_mods: bool = True) -> Accessor:
+        """
+        Evaluate every prop at frame.
+        """
+        default = self._evaluate(0, False) if use_mods else None
+
+        ret = {}
+        for k, pgroup in self._pgroups.items():
+            v = pgroup._values(frame, use_mods, default)
+            ret[k] = v
+
+        return Accessor(ret)
+
+    def _frozen(self) -> "_Frozen":
+        """
+        Values of props that are the same on every frame, computed once
+        until any prop changes (tracked by ``Property._version``).
+        """
+        frozen = self.__dict__.get("_frozen_cache")
+        if frozen is None or frozen.version != Property._version:
+            frozen = _Frozen(self)
+            self.__dict__["_frozen_cache"] = frozen
+        return frozen
 
     def setup(self) -> None:
         """
         Do any animation or property value setting here.
         """
+
+
+class _Frozen:
+    """
+    Scene values split into static props, computed once, and animated
+    props, evaluated each frame.
+    """
+    version: int
+    raw: Accessor
+    default: Accessor
+    static: Mapping[str, Accessor]
+    animated: Mapping[str, List[Tuple[str, Property]]]
+
+    def __init__(self, scene: Scene) -> None:
+        self.version = Property._version
+        self.raw = scene._evaluate(0, False)
+        self.default = scene._evaluate(0)
+
+        self.static = {}
+        self.animated = {}
+        for k, pgroup in scene._pgroups.items():
+            values = {}
+            for name, prop in pgroup._props.items():
+                if prop.animated:
+                    self.animated.setdefault(k, []).append((name, prop))
+                else:
+                    v = getattr(self.default, k)._attrs[name]
+                    if isinstance(v, np.ndarray):
+                        v.flags.writeable = False
+                    values[name] = v
+            self.static[k] = Accessor(values)
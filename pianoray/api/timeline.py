@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from .accessor import Accessor
+from .props import Property
+
+
+class Timeline:
+    """
+    Values of a scene's animated props, baked over a range of frames.
+
+    Each animated prop is one column with a row per frame, so the values
+    of a frame are read by indexing. Columns of Python scalars are lists,
+    others are read only arrays.
+
+    Create with ``Scene.bake``. Can be saved to and loaded from ``.npz``.
+    """
+    frame_start: int
+    frame_end: int
+    key: str
+    columns: Mapping[str, List[Tuple[str, Any]]]  # Group to (name, column)
+
+    def __init__(self, scene, frame_start: int, frame_end: int, key: str,
+            columns: Mapping[str, List[Tuple[str, Any]]]) -> None:
+        self.scene = scene
+        self.frame_start = frame_start
+        self.frame_end = frame_end
+        self.key = key
+        self.columns = columns
+        self.version = Property._version
+
+        for cols in columns.values():
+            for _, col in cols:
+                if isinstance(col, np.ndarray):
+                    col.flags.writeable = False
+
+    @classmethod
+    def bake(cls, scene, frame_start: int, frame_end: int) -> "Timeline":
+        """
+        Evaluate the animated props of ``scene`` on every frame in
+        ``[frame_start, frame_end)``. See ``Property.value_array``.
+        """
+        frozen = scene._frozen()
+        frames = np.arange(frame_start, frame_end)
+
+        columns = {}
+        for k, props in frozen.animated.items():
+            cols = []
+            for name, prop in props:
+                col = prop.value_array(frames, True, frozen.raw)
+                # Scalars as the same types as ``Property.value``, which
+                # are NumPy scalars if a modifier uses NumPy values.
+                first = prop.value(frame_start, True, frozen.raw)
+                if col.ndim == 1 and not isinstance(first, np.generic):
+                    col = col.tolist()
+                cols.append((name, col))
+            columns[k] = cols
+
+        return cls(scene, frame_start, frame_end,
+            cls.fingerprint(scene, frame_start, frame_end), columns)
+
+    @staticmethod
+    def fingerprint(scene, frame_start: int, frame_end: int) -> str:
+        """
+        Hash of everything the baked values depend on: the frame range,
+        keyframes and modifiers of animated props, and the raw values
+        modifiers read.
+        """
+        frozen = scene._frozen()
+        animated = []
+        for k, props in sorted(frozen.animated.items()):
+            for name, prop in props:
+                keys = [(kf.frame, _plain(kf.value), kf.interp)
+                    for kf in prop._keyframes]
+                mods = [type(m).__module__ + "." + type(m).__qualname__
+                    for m in prop.mods]
+                animated.append((k, name, type(prop).__name__, keys, mods))
+
+        data = (frame_start, frame_end, animated,
+            _plain(frozen.raw._as_dict()))
+        return hashlib.sha1(repr(data).encode()).hexdigest()
+
+    def values(self, frame: int) -> Accessor:
+        """
+        Values of all props at frame, like ``Scene.values``.
+        Falls back to evaluating the scene if the frame is out of range or
+        a prop changed since baking.
+        """
+        i = frame - self.frame_start
+        if not 0 <= i < self.frame_end - self.frame_start \
+                or self.version != Property._version:
+            return self.scene.values(frame)
+
+        ret = {}
+        for k, static in self.scene._frozen().static.items():
+            cols = self.columns.get(k)
+            if cols is None:
+                ret[k] = static
+            else:
+                values = static._attrs.copy()
+                for name, col in cols:
+                    values[name] = col[i]
+                ret[k] = Accessor(values)
+
+        return Accessor(ret)
+
+    def save(self, path: Path) -> None:
+        """
+        Save to a ``.npz`` file. The file is replaced atomically, so other
+        processes never load a partial file.
+        """
+        names = []
+        arrays = {}
+        for k, cols in self.columns.items():
+            for name, col in cols:
+                arrays[f"col{len(names)}"] = np.asarray(col)
+                names.append((k, name, isinstance(col, list)))
+
+        meta = {
+            "key": self.key,
+            "frame_start": self.frame_start,
+            "frame_end": self.frame_end,
+            "columns": names,
+        }
+        tmp = Path(f"{path}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as fp:
+            np.savez(fp, meta=json.dumps(meta), **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, scene, path: Path, frame_start: int,
+            frame_end: int) -> Optional["Timeline"]:
+        """
+        Load a timeline saved with ``save``.
+
+        :return: The timeline, or None if the file doesn't exist or was
+            baked from a different scene or frame range.
+        """
+        if not os.path.isfile(path):
+            return None
+
+        key = cls.fingerprint(scene, frame_start, frame_end)
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta["key"] != key:
+                return None
+
+            columns = {}
+            for i, (k, name, is_list) in enumerate(meta["columns"]):
+                col = data[f"col{i}"]
+                if is_list:
+                    col = col.tolist()
+                columns.setdefault(k, []).append((name, col))
+
+        return cls(scene, frame_start, frame_end, key, columns)
+
+
+def _plain(value: Any) -> Any:
+    """
+    Replace arrays with lists, so ``repr`` shows every element.
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    return value
@@ -0,0 +1,396 @@
+"""
+Benchmarks of rendering with synthetic MIDI files and keyboard videos.
+"""
+
+import json
+import multiprocessing
+import resource
+import subprocess
+import sys
+import time
+import wave
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+import cv2
+import mido
+import numpy as np
+
+from . import logger
+from .api import DefaultScene
+from .cpp import load_libs
+from .render import Video
+from .render.render import render_frames
+from .utils import VERSION
+
+# Name to (description, duration in seconds)
+WORKLOADS = {
+    "sparse": ("Single melody, two notes per second", 60),
+    "chords": ("Six note chords, four per second", 60),
+    "trills": ("Trill of 16 notes per second over held bass", 60),
+    "long": ("30 minute piece of melody and chords", 1800),
+}
+
+RESOLUTIONS = ((640, 360), (1280, 720), (1920, 1080))
+
+# Times each startup command is run, the fastest counts
+STARTUP_RUNS = 3
+
+# Scene of the startup render, formatted with the paths of the files
+STARTUP_SCENE = """from pathlib import Path
+
+from pianoray.api import DefaultScene
+from pianoray.bench import setup_scene
+
+
+class Startup(DefaultScene):
+    def setup(self):
+        setup_scene(self, Path({cache!r}), Path({midi!r}), (640, 360))
+"""
+
+# Keyboard video
+KBD_SIZE = (1280, 400)
+KBD_RECT = (40, 100, 1240, 260)  # x1, y1, x2, y2 of the keys
+KBD_FPS = 30
+KBD_LENGTH = 10
+
+
+def synth_notes(workload: str, seed: int = 0) -> List[Tuple[float, float, int]]:
+    """
+    Notes of a synthetic piece.
+
+    :return: List of ``(start seconds, end seconds, MIDI note)``.
+    """
+    rng = np.random.default_rng(seed)
+    duration = WORKLOADS[workload][1]
+    notes = []
+
+    def melody(step, length, low=60, high=96):
+        note = (low+high) // 2
+        for t in np.arange(0, duration, step):
+            note = int(np.clip(note + rng.integers(-4, 5), low, high))
+            notes.append((t, t+length, note))
+
+    def chords(step, length, size):
+        for t in np.arange(0, duration, step):
+            root = int(rng.integers(36, 72))
+            for i in range(size):
+                notes.append((t, t+length, root + 4*i - i//2))
+
+    if workload == "sparse":
+        melody(0.5, 0.4)
+    elif workload == "chords":
+        chords(0.25, 0.5, 6)
+    elif workload == "trills":
+        for i, t in enumerate(np.arange(0, duration, 1/16)):
+            notes.append((t, t+1/16, 72 + i%2))
+        for t in np.arange(0, duration, 2):
+            notes.append((t, t+2, int(rng.integers(36, 48))))
+    elif workload == "long":
+        melody(0.125, 0.2)
+        chords(1, 1, 4)
+
+    return notes
+
+
+def write_midi(path: Path, notes: Sequence[Tuple[float, float, int]]) -> None:
+    """
+    Write notes to a MIDI file at 120 BPM.
+    """
+    ticks_per_beat = 480
+    ticks_per_sec = ticks_per_beat * 2
+
+    events = []
+    for start, end, note in notes:
+        events.append((round(start*ticks_per_sec), 1, note, 80))
+        events.append((round(end*ticks_per_sec), 0, note, 0))
+    events.sort()
+
+    track = mido.MidiTrack()
+    track.append(mido.MetaMessage("set_tempo", tempo=500000))
+    last = 0
+    for tick, on, note, vel in events:
+        kind = "note_on" if on else "note_off"
+        track.append(mido.Message(kind, note=note, velocity=vel, time=tick-last))
+        last = tick
+
+    midi = mido.MidiFile(ticks_per_beat=ticks_per_beat)
+    midi.tracks.append(track)
+    midi.save(str(path))
+
+
+def write_keyboard(path: Path, seed: int = 0) -> None:
+    """
+    Write a video of a keyboard with random keys lit, like a recording of
+    the performance.
+    """
+    rng = np.random.default_rng(seed)
+    x1, y1, x2, y2 = KBD_RECT
+    white_width = (x2-x1) / 52
+
+    base = np.full((*KBD_SIZE[::-1], 3), 30, dtype=np.uint8)
+    base[y1:y2, x1:x2] = 230
+    for i in range(53):
+        x = int(x1 + i*white_width)
+        base[y1:y2, x:x+1] = 60
+
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"),
+        KBD_FPS, KBD_SIZE)
+    for _ in range(KBD_FPS * KBD_LENGTH):
+        img = base.copy()
+        for key in rng.integers(0, 52, 6):
+            x = int(x1 + key*white_width)
+            img[y1:y2, x+1:int(x+white_width)] = (230, 160, 90)
+        noise = rng.integers(0, 8, img.shape, dtype=np.uint8)
+        writer.write(cv2.add(img, noise))
+    writer.release()
+
+
+def write_silence(path: Path) -> None:
+    """
+    Write one second of silent audio. Scenes need an audio file, but the
+    benchmarks don't add audio to the video.
+    """
+    with wave.open(str(path), "wb") as fp:
+        fp.setnchannels(1)
+        fp.setsampwidth(2)
+        fp.setframerate(44100)
+        fp.writeframes(bytes(2 * 44100))
+
+
+def make_scene(cache: Path, midi: Path, resolution: Tuple[int, int]):
+    """
+    Scene rendering the synthetic files, starting at the first note.
+    """
+    scene = DefaultScene()
+    setup_scene(scene, cache, midi, resolution)
+    return scene
+
+
+def setup_scene(scene, cache: Path, midi: Path,
+        resolution: Tuple[int, int]) -> None:
+    """
+    Set the props of a scene to render the synthetic files.
+    See ``make_scene``.
+    """
+    x1, y1, x2, y2 = KBD_RECT
+    scene.video.resolution = resolution
+    scene.midi.file = str(midi)
+    scene.audio.file = str(cache / "silence.wav")
+    scene.comp.margin_start = 0
+    scene.keyboard.file = str(cache / "keyboard.mp4")
+    scene.keyboard.start = 0
+    scene.keyboard.end = KBD_LENGTH
+    scene.keyboard.crop = ((x1, y1), (x2, y1), (x2, y2), (x1, y2))
+
+
+def write_inputs(cache: Path) -> None:
+    """
+    Write the keyboard video and audio shared by all workloads.
+    """
+    cache.mkdir(parents=True, exist_ok=True)
+    if not (cache / "keyboard.mp4").exists():
+        logger.info("Generating keyboard video.")
+        write_keyboard(cache / "keyboard.mp4")
+    write_silence(cache / "silence.wav")
+
+
+def _time_command(args: Sequence[str]) -> float:
+    """
+    Fastest wall time in seconds of ``STARTUP_RUNS`` runs of a command.
+    """
+    times = []
+    for _ in range(STARTUP_RUNS):
+        start = time.time()
+        subprocess.run(args, check=True, stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL)
+        times.append(time.time() - start)
+    return min(times)
+
+
+def startup(cache: Path) -> Dict[str, float]:
+    """
+    Time the command line in new processes: ``pianoray --version``, and a
+    render of one frame, which is mostly importing the render modules,
+    building the C libraries, parsing MIDI and adding audio. One frame, as
+    a video can't be empty.
+
+    :return: Mapping of command name to seconds.
+    """
+    write_inputs(cache)
+    midi = cache / "sparse.mid"
+    write_midi(midi, synth_notes("sparse"))
+    scene = cache / "startup_scene.py"
+    with open(scene, "w") as fp:
+        fp.write(STARTUP_SCENE.format(cache=str(cache.absolute()),
+            midi=str(midi.absolute())))
+
+    pianoray = [sys.executable, "-m", "pianoray"]
+    results = {
+        "version": _time_command([*pianoray, "--version"]),
+        "render": _time_command([*pianoray, "-y", "render",
+            "-c", str(cache / "startup"), "--frame-cache", "0",
+            "-o", str(cache / "startup.mp4"), "--frames", "0:1",
+            str(scene), "Startup"]),
+    }
+    for name, t in results.items():
+        logger.info(f"Startup of {name}: {t:.2f} s")
+    return {name: round(t, 3) for name, t in results.items()}
+
+
+def _run_case(cache: Path, midi: Path, resolution: Tuple[int, int],
+        frames: int, jobs: int, queue: multiprocessing.Queue) -> None:
+    """
+    Render a case in a new process, so its peak RSS is its own.
+    Puts ``(frames per second, peak RSS in MB)`` in the queue.
+    """
+    scene = make_scene(cache, midi, resolution)
+    libs = load_libs(cache, build=False)
+    video = Video(cache / "output", scene.default)
+
+    start = time.time()
+    count = len(render_frames(scene, libs, video, cache, jobs=jobs,
+        window=slice(0, frames)))
+    video.finish()
+    elapsed = time.time() - start
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((count / elapsed, rss))
+
+
+def run(cache: Path, workloads: Sequence[str],
+        resolutions: Sequence[Tuple[int, int]], frames: int,
+        jobs: int = 1) -> Dict[str, Dict[str, Any]]:
+    """
+    Render every workload at every resolution.
+
+    :param frames: Number of frames to render of each case.
+    :return: Mapping of case name to results.
+    """
+    write_inputs(cache)
+    load_libs(cache)
+
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for workload in workloads:
+        notes = synth_notes(workload)
+        midi = cache / f"{workload}.mid"
+        write_midi(midi, notes)
+
+        for resolution in resolutions:
+            name = f"{workload}@{resolution[0]}x{resolution[1]}"
+            logger.info(f"Running {name}: {WORKLOADS[workload][0]}, "
+                f"{len(notes)} notes.")
+
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_case, args=(cache, midi, resolution,
+                frames, jobs, queue))
+            proc.start()
+            proc.join()
+            if proc.exitcode != 0:
+                raise RuntimeError(f"Benchmark {name} failed.")
+            fps, rss = queue.get()
+
+            results[name] = {
+                "workload": workload,
+                "resolution": list(resolution),
+                "notes": len(notes),
+                "frames": frames,
+                "jobs": jobs,
+                "fps": round(fps, 3),
+                "peak_rss_mb": round(rss, 1),
+            }
+            logger.info(f"{name}: {fps:.2f} frames/s, peak RSS {rss:.0f} MB")
+
+    return results
+
+
+def compare(results: Mapping[str, Mapping], baseline: Mapping[str, Mapping],
+        threshold: float) -> List[str]:
+    """
+    Compare results to a baseline.
+
+    :param threshold: Fraction a result may be worse than the baseline.
+    :return: Descriptions of regressions.
+    """
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+
+        fps, base_fps = res["fps"], base["fps"]
+        if fps < base_fps * (1-threshold):
+            regressions.append(f"{name}: {fps:.2f} frames/s, baseline "
+                f"{base_fps:.2f}")
+        rss, base_rss = res["peak_rss_mb"], base["peak_rss_mb"]
+        if rss > base_rss * (1+threshold):
+            regressions.append(f"{name}: peak RSS {rss:.0f} MB, baseline "
+                f"{base_rss:.0f} MB")
+
+    return regressions
+
+
+def compare_startup(times: Mapping[str, float],
+        baseline: Mapping[str, float], threshold: float) -> List[str]:
+    """
+    Compare startup times to a baseline. See ``compare``.
+    """
+    regressions = []
+    for name, t in times.items():
+        base = baseline.get(name)
+        if base is not None and t > base * (1+threshold):
+            regressions.append(f"startup of {name}: {t:.2f} s, baseline "
+                f"{base:.2f} s")
+    return regressions
+
+
+def bench(args) -> int:
+    """
+    Call this when the user requests bench, e.g.
+    pianoray bench ...
+
+    :return: Exit code, 1 if a result regressed.
+    """
+    workloads = list(WORKLOADS)
+    if args.workloads is not None:
+        workloads = args.workloads.split(",")
+    for w in workloads:
+        if w not in WORKLOADS:
+            raise ValueError(f"Unknown workload {w}, choose from "
+                f"{', '.join(WORKLOADS)}")
+    resolutions = RESOLUTIONS
+    if args.resolutions is not None:
+        resolutions = [tuple(map(int, r.split("x")))
+            for r in args.resolutions.split(",")]
+
+    times = startup(args.cache / "bench")
+    results = run(args.cache / "bench", workloads, resolutions, args.frames,
+        args.jobs)
+
+    data = {"version": VERSION, "startup": times, "cases": results}
+    if args.output is not None:
+        with open(args.output, "w") as fp:
+            json.dump(data, fp, indent=4)
+        logger.info(f"Results saved to {args.output}")
+
+    if args.baseline is None:
+        return 0
+    if not args.baseline.exists() or args.update:
+        with open(args.baseline, "w") as fp:
+            json.dump(data, fp, indent=4)
+        logger.info(f"Baseline saved to {args.baseline}")
+        return 0
+
+    with open(args.baseline, "r") as fp:
+        baseline = json.load(fp)
+    regressions = compare(results, baseline["cases"], args.threshold)
+    regressions += compare_startup(times, baseline.get("startup", {}),
+        args.threshold)
+    for msg in regressions:
+        logger.error(f"Regression: {msg}")
+    if regressions:
+        return 1
+
+    logger.info(f"No regressions past {args.threshold:.0%} of the baseline.")
+    return 0
@@ -0,0 +1,77 @@
+"""
+Pool of reusable image buffers.
+"""
+
+import resource
+from threading import Lock
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+class BufferPool:
+    """
+    Hands out arrays and takes them back for reuse, so rendering a frame
+    doesn't allocate new images.
+
+    Buffers are grouped by shape and dtype. Any array can be given back,
+    including ones not taken from the pool (e.g. frames read from the frame
+    cache). At most ``limit`` free buffers of each group are kept.
+
+    Safe to use from multiple threads.
+    """
+
+    def __init__(self, limit: int = 16) -> None:
+        self.limit = limit
+
+        self.allocated = 0  # Buffers allocated by the pool
+        self.nbytes = 0     # Bytes allocated by the pool
+        self.in_use = 0     # Taken and not given back
+        self.peak = 0       # Max of in_use
+
+        self._free: Dict[Tuple, List[np.ndarray]] = {}
+        self._lock = Lock()
+
+    def take(self, shape, dtype, zero: bool = False) -> np.ndarray:
+        """
+        Get a buffer. Contents are undefined unless ``zero`` is set.
+        """
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            free = self._free.get(key)
+            buf = free.pop() if free else None
+            self.in_use += 1
+            self.peak = max(self.peak, self.in_use)
+
+        if buf is None:
+            buf = np.empty(shape, dtype=dtype)
+            with self._lock:
+                self.allocated += 1
+                self.nbytes += buf.nbytes
+
+        if zero:
+            buf.fill(0)
+        return buf
+
+    def give(self, buf: np.ndarray) -> None:
+        """
+        Return a buffer for reuse. It must not be used after this.
+        """
+        if not buf.flags.c_contiguous or not buf.flags.owndata:
+            return
+
+        key = (buf.shape, buf.dtype.str)
+        with self._lock:
+            self.in_use = max(self.in_use-1, 0)
+            free = self._free.setdefault(key, [])
+            if len(free) < self.limit:
+                free.append(buf)
+
+    def stats(self) -> str:
+        """
+        Allocations by the pool and peak RSS of this process.
+        """
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return (f"{self.allocated} buffers allocated "
+            f"({self.nbytes/1e6:.1f} MB), {self.peak} in use at once, "
+            f"peak RSS {rss:.0f} MB")
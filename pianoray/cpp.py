@@ -3,22 +3,33 @@ C++ library compilation and handling.
 """
 
 import ctypes
+import fcntl
+import hashlib
+import importlib.machinery
 import os
 import re
+import subprocess
+import tempfile
+from functools import lru_cache
 from pathlib import Path
 from subprocess import Popen
-from typing import List, Mapping, Sequence
+from typing import List, Mapping, Optional, Sequence, Tuple
 
 import numpy as np
 from numpy.ctypeslib import ndpointer
 
 from . import logger
+from .kernel_sources import source_hash
+from .midi import NOTE_DTYPE
 from .utils import GCC
 
 ROOT = Path(__file__).absolute().parent
 
 CPP_UTILS = ROOT / "cutils"
 
+# Kernels prebuilt at install time, see setup.py.
+EXTENSION = "_kernels"
+
 
 class Types:
     """
@@ -39,20 +50,11 @@ class Types:
     for t in ("char", "uchar", "int", "uint", "float", "double"):
         exec(_arr_code.format("arr", t, 1))
 
-    for t in ("uchar", "double"):
+    for t in ("uchar", "float", "double"):
         exec(_arr_code.format("img", t, 3))
 
-    @staticmethod
-    def cstr(s):
-        """
-        Numpy array of chars, null terminated.
-        """
-        if not isinstance(s, bytes):
-            s = str(s).encode()
-
-        data = list(s)
-        data.append(0)
-        return np.array(data, dtype=np.int8)
+    # Notes array, Note* in pr_midi.hpp
+    arr_note = ndpointer(dtype=NOTE_DTYPE, ndim=1, flags=_arr_flags)
 
     @staticmethod
     def c_to_attr(type):
@@ -68,52 +70,207 @@ class Types:
             raise ValueError(f"Cannot understand C type {type}")
 
 
-def build_lib(cache: Path, files: Sequence[str], name: str) -> ctypes.CDLL:
+# Compiler flags, part of the build cache key.
+# Without OpenMP, its pragmas are ignored, so don't warn about them.
+CFLAGS = ("-Wall", "-Wno-unknown-pragmas", "-O3", "-fno-trapping-math",
+    "-fPIC")
+LDFLAGS = ("-shared",)
+# Added to both if the compiler supports them, see ``build_flags``.
+OPENMP_FLAGS = ("-fopenmp",)
+
+# Uses OpenMP, so it fails to compile or link without it.
+_OPENMP_PROBE = """
+#include <omp.h>
+int main() {
+    int n = 0;
+    #pragma omp parallel for reduction(+:n)
+    for (int i = 0; i < 4; i++)
+        n += omp_get_thread_num() >= 0;
+    return n != 4;
+}
+"""
+
+
+@lru_cache(maxsize=None)
+def compiler_version() -> str:
+    """
+    Output of ``g++ --version``, part of the build cache key.
     """
-    Build and load a library.
+    p = subprocess.run([GCC, "--version"], capture_output=True, text=True)
+    return f"{GCC}\n{p.stdout}"
 
-    :param files: C files relative to THIS file.
-    :param cache: Cache directory.
-    :param name: Name of the library.
-    :return: C library.
+
+@lru_cache(maxsize=None)
+def build_flags() -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
     """
-    logger.info(f"Building C library {name}")
+    Compiler and linker flags: ``CFLAGS`` and ``LDFLAGS``, plus
+    ``OPENMP_FLAGS`` if a small OpenMP program builds with them. Without
+    OpenMP (e.g. Apple clang), the kernels ignore the pragmas and render
+    with one thread.
 
-    cache = cache / name
-    os.makedirs(cache, exist_ok=True)
+    :return: ``(compiler flags, linker flags)``.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / "probe.cpp"
+        src.write_text(_OPENMP_PROBE)
+        p = subprocess.run([GCC, *OPENMP_FLAGS, src, "-o", Path(tmp) / "probe"],
+            capture_output=True)
 
-    files = [ROOT/f for f in files]
+    if p.returncode != 0:
+        logger.warn(f"{GCC} doesn't support OpenMP, C kernels will render "
+            "with one thread.")
+        return CFLAGS, LDFLAGS
+    return (*CFLAGS, *OPENMP_FLAGS), (*LDFLAGS, *OPENMP_FLAGS)
 
-    obj_files = []
-    for f in files:
-        obj_path = str(cache / f.with_suffix(".o").name)
-        obj_files.append(obj_path)
-        compile(str(f), obj_path)
 
-    lib_path = str(cache / f"lib{name}.so")
-    link(obj_files, lib_path)
+def sources(files: Sequence[str]) -> List[Path]:
+    """
+    C++ files and every header they include from ``cutils``, recursively.
+    """
+    found = []
+    todo = [Path(f) for f in files]
+    while todo:
+        path = todo.pop(0)
+        if path in found:
+            continue
+        found.append(path)
+        with open(path, "r") as fp:
+            for inc in re.findall(r'#include\s*"([^"]+)"', fp.read()):
+                todo.append(CPP_UTILS / inc)
+
+    return found
 
-    return ctypes.CDLL(lib_path)
 
-def compile(cpp, obj):
+def lib_key(files: Sequence[str]) -> str:
     """
-    Compile a C++ file and output to obj file.
+    Hash of everything a built library depends on: its sources including
+    headers, the compiler version, and the flags.
     """
-    args = [GCC, "-Wall", "-O3", "-c", "-fPIC", cpp, "-o", obj, "-I", CPP_UTILS]
-    p = Popen(args)
-    p.wait()
-    assert p.returncode == 0
+    hasher = hashlib.sha1(compiler_version().encode())
+    hasher.update(repr(build_flags()).encode())
+    for path in sources(files):
+        hasher.update(path.name.encode())
+        with open(path, "rb") as fp:
+            hasher.update(fp.read())
+    return hasher.hexdigest()
+
+
+def lib_path(cache: Path, files: Sequence[str], name: str) -> Path:
+    """
+    Path of a built library in the build cache.
+
+    :param cache: Cache directory of the libraries.
+    """
+    return cache / name / lib_key(files)[:16] / f"lib{name}.so"
+
+
+def build_libs(cache: Path, libs: Mapping[str, Sequence[str]]) -> None:
+    """
+    Build libraries not in the build cache.
+
+    Builds are cached by ``lib_key``, so a library is only compiled again
+    when its sources, the compiler or the flags change. Files of all
+    libraries are compiled in parallel. Holds a lock on the cache while
+    building, and moves each library into place when it's complete, so
+    renders starting at once don't build the same library or load a
+    partial one.
+
+    :param cache: Cache directory of the libraries.
+    :param libs: Mapping of library name to C++ files.
+    """
+    cache.mkdir(parents=True, exist_ok=True)
+    missing = {n: f for n, f in libs.items()
+        if not lib_path(cache, f, n).is_file()}
+    if not missing:
+        return
+
+    with open(cache / "build.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # Another process may have built them while we waited.
+        missing = {n: f for n, f in missing.items()
+            if not lib_path(cache, f, n).is_file()}
+
+        with tempfile.TemporaryDirectory(dir=cache) as tmp:
+            tmp = Path(tmp)
+            procs = []
+            objs = {}
+            for name, files in missing.items():
+                logger.info(f"Building C library {name}")
+                objs[name] = []
+                for f in files:
+                    obj = tmp / name / Path(f).with_suffix(".o").name
+                    obj.parent.mkdir(exist_ok=True)
+                    objs[name].append(obj)
+                    procs.append(compile(f, obj))
+            for p in procs:
+                if p.wait() != 0:
+                    raise AssertionError(f"Compiling failed: {p.args}")
+
+            for name, files in missing.items():
+                path = lib_path(cache, files, name)
+                tmp_lib = tmp / name / path.name
+                link(objs[name], tmp_lib)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_lib, path)
+
+def compile(cpp, obj) -> Popen:
+    """
+    Start compiling a C++ file to an obj file.
+
+    :return: The compiler process, to wait for.
+    """
+    args = [GCC, *build_flags()[0], "-c", cpp, "-o", obj, "-I", CPP_UTILS]
+    return Popen(args)
 
 def link(obj_files, lib_path):
     """
     Link object files.
     """
-    args = [GCC, "-shared", "-o", lib_path, *obj_files]
+    args = [GCC, *build_flags()[1], "-o", lib_path, *obj_files]
     p = Popen(args)
     p.wait()
     assert p.returncode == 0
 
 
+@lru_cache(maxsize=None)
+def load_extension() -> Optional[ctypes.CDLL]:
+    """
+    Load the kernels prebuilt at install time.
+
+    :return: The library, or None if it wasn't built, was built from
+        different sources (e.g. they were edited since), or the environment
+        variable ``PIANORAY_JIT`` is set.
+    """
+    if os.environ.get("PIANORAY_JIT"):
+        return None
+    for suffix in importlib.machinery.EXTENSION_SUFFIXES:
+        path = ROOT / (EXTENSION+suffix)
+        if path.is_file():
+            break
+    else:
+        return None
+
+    lib = ctypes.CDLL(str(path))
+    lib.pr_source_hash.restype = ctypes.c_char_p
+    if lib.pr_source_hash().decode() != source_hash():
+        logger.warn("Prebuilt C kernels are out of date, using the runtime build.")
+        return None
+    return lib
+
+
+# Image types of pr_image.hpp
+IMG_TYPES = {
+    "CImg": "img_uchar",
+    "FImg": "img_float",
+    "DImg": "img_double",
+}
+
+# Structs passed as pointers to arrays
+STRUCT_TYPES = {
+    "Note": "arr_note",
+}
+
+
 def parse_args(path, func_name) -> List:
     """
     Use regex to parse the arguments of a C++ function.
@@ -122,7 +279,7 @@ def parse_args(path, func_name) -> List:
     with open(path, "r") as fp:
         data = fp.read()
 
-    start = re.search(r'extern\s*"C"\s*void\s*' + func_name, data)
+    start = re.search(r'extern\s*"C"\s*void\s*' + func_name + r"\s*\(", data)
     if start is None:
         raise ValueError("Function declaration not found.")
     start = start.start()
@@ -135,8 +292,10 @@ def parse_args(path, func_name) -> List:
         ptr = "*" in type
         type = type.replace("*", "").strip()
 
-        if type in ("CImg", "DImg"):
-            attr = "img_uchar" if type == "CImg" else "img_double"
+        if type in IMG_TYPES:
+            attr = IMG_TYPES[type]
+        elif type in STRUCT_TYPES:
+            attr = STRUCT_TYPES[type]
         else:
             attr = Types.c_to_attr(type)
             if ptr:
@@ -147,11 +306,16 @@ def parse_args(path, func_name) -> List:
     return args
 
 
-def load_one_lib(cache: Path, cfiles, name, funcs) -> ctypes.CDLL:
+def load_one_lib(cache: Path, cfiles, name, funcs,
+        lib: Optional[ctypes.CDLL] = None) -> ctypes.CDLL:
     """
-    Load one library and sets the argtypes.
+    Load one built library and sets the argtypes.
+
+    :param lib: Library containing the functions, e.g. the extension.
+        If None, loads the library from the build cache.
     """
-    lib = build_lib(cache, cfiles, name)
+    if lib is None:
+        lib = ctypes.CDLL(str(lib_path(cache, cfiles, name)))
 
     for func in funcs:
         for file in cfiles:
@@ -167,21 +331,31 @@ def load_one_lib(cache: Path, cfiles, name, funcs) -> ctypes.CDLL:
 
     return lib
 
-def load_libs(cache: Path) -> Mapping[str, ctypes.CDLL]:
+def load_libs(cache: Path, build: bool = True) -> Mapping[str, ctypes.CDLL]:
     """
     Load C libraries.
+
+    Uses the kernels prebuilt at install time if they are up to date (see
+    ``load_extension``), and else the libraries built at runtime.
+
+    :param build: Whether to build libraries that aren't in the build cache
+        first (see ``build_libs``). If False, they must have been built,
+        e.g. in worker processes.
     """
     cache = cache / "c_libs"
-    cache.mkdir(parents=True, exist_ok=True)
 
     libs = {
-        "blocks": (["blocks.cpp"], ["render_blocks"]),
-        "composite": (["composite.cpp"], ["composite"]),
+        "blocks": (["blocks.cpp"], ["render_blocks", "render_blocks_f"]),
+        "composite": (["composite.cpp"], ["composite", "composite_f"]),
     }
+    files = {k: [str(CPP_UTILS / f) for f in v[0]] for k, v in libs.items()}
+
+    ext = load_extension()
+    if ext is None and build:
+        build_libs(cache, files)
 
     real_libs = {}
-    for key, (files, funcs) in libs.items():
-        files = [str(CPP_UTILS / f) for f in files]
-        real_libs[key] = load_one_lib(cache, files, key, funcs)
+    for key, (_, funcs) in libs.items():
+        real_libs[key] = load_one_lib(cache, files[key], key, funcs, ext)
 
     return real_libs
@@ -1,4 +1,7 @@
+#include <algorithm>
 #include <iostream>
+#include <limits>
+#include <vector>
 
 #include "pr_image.hpp"
 #include "pr_midi.hpp"
@@ -42,8 +45,13 @@ double dist_to_block(double px, double py, const Rect& rect, double r)
 }
 
 
-void draw_block(ImageD& img, const Rect& rect, const ColorD& color, double radius,
-        double bottom_glow, double bottom_glow_len) {
+/**
+ * Draw the part of a block in rows [row_min, row_max).
+ */
+template<class T>
+void draw_block(Image<T>& img, const Rect& rect, const Color<T>& color,
+        double radius, double bottom_glow, double bottom_glow_len,
+        int row_min, int row_max) {
     const double x = rect.x, y = rect.y, w = rect.w, h = rect.h;
     const int width = img.width, height = img.height;
     const int half = height / 2;
@@ -51,11 +59,11 @@ void draw_block(ImageD& img, const Rect& rect, const ColorD& color, double radiu
 
     int x_min = (int)dbounds(x-1, 0, width-1);
     int x_max = (int)dbounds(x+w+2, 0, width-1);
-    int y_min = (int)dbounds(y-1, 0, half);
-    int y_max = (int)dbounds(y+h+2, 0, half);
+    int y_min = std::max((int)dbounds(y-1, 0, half), row_min);
+    int y_max = std::min((int)dbounds(y+h+2, 0, half), row_max);
 
-    for (int x = x_min; x < x_max; x++) {
-        for (int y = y_min; y < y_max; y++) {
+    for (int y = y_min; y < y_max; y++) {
+        for (int x = x_min; x < x_max; x++) {
             double dist = dist_to_block(x, y, rect, radius);
             double fac = dbounds(interp(dist, 0, 1, 1, 0), 0, 1);
 
@@ -73,19 +81,44 @@ void draw_block(ImageD& img, const Rect& rect, const ColorD& color, double radiu
 
 /**
  * New render blocks.
+ *
+ * @param threads  Number of threads. Each draws every block in its own
+ *     bands of rows, in the same order, so the image is the same for any
+ *     number of threads.
  */
-extern "C" void render_blocks(
-    DImg d_img, int width, int height,
-    int frame, char* notes_str,
+template<class T>
+void render_blocks_t(
+    T* d_img, int width, int height,
+    int frame, int num_notes, Note* notes,
+    int* index_order, double* index_starts, double* index_max_ends,
     double p_video_fps, double p_piano_blackWidthFac, double p_blocks_speed,
     double* dp_blocks_color, double p_blocks_radius, double p_blocks_bottomGlow,
-    double p_blocks_bottomGlowLen
+    double p_blocks_bottomGlowLen, int threads
 ) {
-    ImageD img(d_img, width, height);
-    Midi midi(notes_str);
-    ColorD p_blocks_color(dp_blocks_color);
+    Image<T> img(d_img, width, height);
+    Midi midi(num_notes, notes);
+    NoteIndex index(num_notes, index_order, index_starts, index_max_ends);
+    Color<T> p_blocks_color(ColorD{dp_blocks_color});
+
+    // Frames of notes whose blocks can be visible, i.e. between the
+    // frames at the top (y = 0) and bottom (y = height/2) of the blocks
+    // area, with a margin for rounding. Every frame is visible at speed 0.
+    double lo = -std::numeric_limits<double>::infinity();
+    double hi = std::numeric_limits<double>::infinity();
+    const int half = height / 2;
+    const double px_speed = p_blocks_speed * half / (int)p_video_fps;
+    if (px_speed != 0) {
+        const double top = frame + half/px_speed;
+        lo = std::min<double>(frame, top) - 1;
+        hi = std::max<double>(frame, top) + 1;
+    }
 
-    for (int i = 0; i < midi.count; i++) {
+    // Drawn in the order of the notes array, as blocks can overlap.
+    std::vector<int> visible;
+    index.query(midi, lo, hi, visible);
+
+    std::vector<Rect> rects;
+    for (int i: visible) {
         const Note note = midi[i];
 
         // Y bounds of rect.
@@ -115,8 +148,52 @@ extern "C" void render_blocks(
         rect.y = y_up;
         rect.w = x_end - x_start;
         rect.h = y_down - y_up;
+        rects.push_back(rect);
+    }
 
-        draw_block(img, rect, p_blocks_color, p_blocks_radius, p_blocks_bottomGlow,
-            p_blocks_bottomGlowLen);
+    // More bands than threads, as blocks aren't spread evenly.
+    const int bands = threads > 1 ? std::min(threads * 4, half) : 1;
+    #pragma omp parallel for num_threads(threads) schedule(dynamic) \
+        if(threads > 1)
+    for (int b = 0; b < bands; b++) {
+        const int row_min = half * b / bands;
+        const int row_max = half * (b+1) / bands;
+        for (const Rect& rect: rects) {
+            draw_block(img, rect, p_blocks_color, p_blocks_radius,
+                p_blocks_bottomGlow, p_blocks_bottomGlowLen, row_min, row_max);
+        }
     }
 }
+
+
+extern "C" void render_blocks(
+    DImg d_img, int width, int height,
+    int frame, int num_notes, Note* notes,
+    int* index_order, double* index_starts, double* index_max_ends,
+    double p_video_fps, double p_piano_blackWidthFac, double p_blocks_speed,
+    double* dp_blocks_color, double p_blocks_radius, double p_blocks_bottomGlow,
+    double p_blocks_bottomGlowLen, int threads
+) {
+    render_blocks_t(d_img, width, height, frame, num_notes, notes,
+        index_order, index_starts, index_max_ends,
+        p_video_fps, p_piano_blackWidthFac, p_blocks_speed, dp_blocks_color,
+        p_blocks_radius, p_blocks_bottomGlow, p_blocks_bottomGlowLen, threads);
+}
+
+
+/**
+ * Single precision version of ``render_blocks``.
+ */
+extern "C" void render_blocks_f(
+    FImg d_img, int width, int height,
+    int frame, int num_notes, Note* notes,
+    int* index_order, double* index_starts, double* index_max_ends,
+    double p_video_fps, double p_piano_blackWidthFac, double p_blocks_speed,
+    double* dp_blocks_color, double p_blocks_radius, double p_blocks_bottomGlow,
+    double p_blocks_bottomGlowLen, int threads
+) {
+    render_blocks_t(d_img, width, height, frame, num_notes, notes,
+        index_order, index_starts, index_max_ends,
+        p_video_fps, p_piano_blackWidthFac, p_blocks_speed, dp_blocks_color,
+        p_blocks_radius, p_blocks_bottomGlow, p_blocks_bottomGlowLen, threads);
+}
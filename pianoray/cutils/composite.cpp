@@ -1,31 +1,82 @@
-#include <cmath>
+#include <algorithm>
 
 #include "pr_image.hpp"
 
 
+/**
+ * Tone map one row of channels. Separate from composite_t, with restrict
+ * pointers, so the compiler vectorizes the loop.
+ */
+template<class T>
+void composite_row(
+    const T* __restrict in, unsigned char* __restrict out, int size,
+    T shutter, const float* __restrict lut, T last
+) {
+    for (int i = 0; i < size; i++) {
+        // Comparisons are false for NaN, so NaN becomes 0 and infinity
+        // (where t is NaN) becomes the last entry.
+        const T v = in[i] * shutter;
+        const T u = v > 0 ? v : 0;
+        const T t = u / (1+u) * last;
+        const T x = t < last ? t : last;
+
+        int j = (int)x;
+        j = std::min(std::max(j, 0), (int)last);
+        const T frac = x - j;
+        out[i] = (unsigned char)(lut[j] + frac * (lut[j+1]-lut[j]));
+    }
+}
+
+
 /**
  * Composite an image.
  *
+ * Maps each channel through the tone curve, which is a lookup table of
+ * 8-bit values indexed by ``t = u / (1+u)`` of the shutter scaled value
+ * ``u``, so it covers every value from 0 to infinity. Values between
+ * entries are interpolated linearly, and negative values are clamped to 0.
+ *
+ * Reads the image in memory order, as flat rows of channels.
+ *
  * @param in_data  Input float image.
  * @param out_data  Output char image.
+ * @param lut, lut_size  Tone curve at ``t = i / (lut_size-1)``. Has one
+ *     more entry than ``lut_size``, a copy of the last.
+ * @param threads  Number of threads, each compositing a band of rows.
  */
+template<class T>
+void composite_t(
+    T* in_data, CImg out_data, int width, int height,
+    double prop_comp_shutter, float* lut, int lut_size, int threads
+) {
+    const int row_size = width * 3;
+
+    #pragma omp parallel for num_threads(threads) schedule(static) \
+        if(threads > 1)
+    for (int y = 0; y < height; y++) {
+        composite_row<T>(in_data + (long)y * row_size,
+            out_data + (long)y * row_size, row_size, prop_comp_shutter,
+            lut, lut_size - 1);
+    }
+}
+
+
 extern "C" void composite(
     DImg in_data, CImg out_data, int width, int height,
-    double prop_comp_shutter
+    double prop_comp_shutter, float* lut, int lut_size, int threads
 ) {
-    ImageD input(in_data, width, height);
-    ImageC output(out_data, width, height);
-
-    // Use tanh
-    for (int x = 0; x < width; x++) {
-        for (int y = 0; y < height; y++) {
-            ColorD raw = input.get(x, y);
-            ColorC col;
-            for (int i = 0; i < 3; i++) {
-                double v = tanh(prop_comp_shutter * raw.get(i));
-                col.set(i, 255 * v);
-            }
-            output.set(x, y, col);
-        }
-    }
+    composite_t(in_data, out_data, width, height, prop_comp_shutter,
+        lut, lut_size, threads);
+}
+
+
+/**
+ * Single precision version of ``composite``.
+ */
+extern "C" void composite_f(
+    FImg in_data, CImg out_data, int width, int height,
+    double prop_comp_shutter, float* lut, int lut_size, int threads
+) {
+    composite_t(in_data, out_data, width, height, prop_comp_shutter,
+        lut, lut_size, threads);
 }
@@ -0,0 +1,18 @@
+/**
+ * Extra symbols of the prebuilt kernels extension, pianoray._kernels,
+ * which links this file with the other libraries' C++ files.
+ * See setup.py and load_extension in pianoray/cpp.py.
+ */
+
+#ifndef PR_SOURCE_HASH
+#define PR_SOURCE_HASH ""
+#endif
+
+
+/**
+ * Hash of the sources the extension was built from, to detect when they
+ * were edited since.
+ */
+extern "C" const char* pr_source_hash() {
+    return PR_SOURCE_HASH;
+}
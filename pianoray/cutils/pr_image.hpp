@@ -41,6 +41,16 @@ struct Color {
         this->b = other.b;
     }
 
+    /**
+     * Convert from a color of another type.
+     */
+    template<class U>
+    explicit Color(const Color<U>& other) {
+        r = other.r;
+        g = other.g;
+        b = other.b;
+    }
+
     /**
      * Get r, g, b based on i = 0, 1, 2
      * Returns 0 if i != 0, 1, 2
@@ -142,9 +152,12 @@ public:
 // Lexical parser Python-side will see these instead of pointers and
 // will know that expected numpy array dimension is 3.
 using CImg = unsigned char*;
+using FImg = float*;
 using DImg = double*;
 
 using ColorC = Color<unsigned char>;
+using ColorF = Color<float>;
 using ColorD = Color<double>;
 using ImageC = Image<unsigned char>;
+using ImageF = Image<float>;
 using ImageD = Image<double>;
@@ -1,12 +1,18 @@
+#include <algorithm>
 #include <iostream>
+#include <vector>
 
 
+/**
+ * Same layout as pianoray.midi.NOTE_DTYPE.
+ */
 struct Note {
     double start, end;
     unsigned char note, velocity;
 };
+static_assert(sizeof(Note) == 24, "Note must match NOTE_DTYPE");
 
-std::ostream& operator<<(std::ostream& os, const Note& note) {
+inline std::ostream& operator<<(std::ostream& os, const Note& note) {
     os << "Note(start=" << note.start << ", end=" << note.end
         << ", note=" << +note.note << ", velocity=" << +note.velocity
         << ")";
@@ -15,31 +21,65 @@ std::ostream& operator<<(std::ostream& os, const Note& note) {
 
 
 /**
- * Unserialize MIDI notes according to docs.
+ * MIDI notes, read directly from the NumPy array of notes (see docs).
  */
 struct Midi {
-    const static int note_size = 2*8 + 2*1;
-
     int count;
-    char* data;
+    const Note* notes;
 
-    Midi(char* data) {
-        count = *(int*)(data);
-        this->data = data + 4;
+    Midi(int count, const Note* notes) {
+        this->count = count;
+        this->notes = notes;
     }
 
-    Note get(int i) {
-        char* d = data + i*note_size;
-        Note n;
-        n.start = *(double*)(d);
-        n.end = *(double*)(d+8);
-        n.note = *(unsigned char*)(d+16);
-        n.velocity = *(unsigned char*)(d+17);
+    const Note& get(int i) const {
+        return notes[i];
+    }
 
-        return n;
+    const Note& operator[](int i) const {
+        return notes[i];
     }
+};
+
+
+/**
+ * Index of notes by time, to find notes overlapping a range of frames
+ * without visiting every note. Built once in Python (see Blocks).
+ *
+ * order: Indices of notes sorted by start.
+ * starts: Starts of notes in that order.
+ * max_ends: Running max of ends of notes in that order.
+ */
+struct NoteIndex {
+    int count;
+    const int* order;
+    const double* starts;
+    const double* max_ends;
+
+    NoteIndex(int count, const int* order, const double* starts,
+            const double* max_ends) {
+        this->count = count;
+        this->order = order;
+        this->starts = starts;
+        this->max_ends = max_ends;
+    }
+
+    /**
+     * Indices of notes with start <= hi and end >= lo, in increasing order
+     * (i.e. the order of the notes array).
+     */
+    void query(const Midi& midi, double lo, double hi,
+            std::vector<int>& out) const {
+        out.clear();
+        // Notes after this start after hi.
+        int last = std::upper_bound(starts, starts+count, hi) - starts;
+        // Notes before this all end before lo.
+        int first = std::lower_bound(max_ends, max_ends+last, lo) - max_ends;
 
-    Note operator[](int i) {
-        return get(i);
+        for (int i = first; i < last; i++) {
+            if (midi[order[i]].end >= lo)
+                out.push_back(order[i]);
+        }
+        std::sort(out.begin(), out.end());
     }
 };
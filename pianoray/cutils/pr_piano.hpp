@@ -4,7 +4,7 @@
 /**
  * If key is white.
  */
-bool is_white_key(int key) {
+inline bool is_white_key(int key) {
     int v = key % 12;
     if (v == 1 || v == 4 || v == 6 || v == 9 || v == 11)
         return false;
@@ -15,7 +15,7 @@ bool is_white_key(int key) {
  * Position of the center of the key on the keyboard.
  * @return  Factor from 0 to 1 (start of first key to end of last).
  */
-double key_pos(int key) {
+inline double key_pos(int key) {
     double white_width = 1.0 / 52;
 
     bool last_white = false;  // Last key is white
@@ -41,7 +41,7 @@ double key_pos(int key) {
  * @param width  settings.video.resolution[0]
  * @param black_width_fac  settings.piano.black_width_fac
  */
-void key_coords(
+inline void key_coords(
     double& left, double& right, int key,
     int width, double black_width_fac)
 {
@@ -65,7 +65,7 @@ void key_coords(
  * @param fps  settings.video.fps
  * @param speed  settings.blocks.speed
  */
-double event_coord(
+inline double event_coord(
     double event_frame, double frame,
     int height, int fps, double speed)
 {
@@ -7,7 +7,7 @@ constexpr int LARGE = (int)1e9;
 /**
  * Float between 0 and 1.
  */
-double random() {
+inline double random() {
     int r = rand() % LARGE;
     return (double)r / LARGE;
 }
@@ -15,14 +15,14 @@ double random() {
 /**
  * Float between a and b.
  */
-double uniform(double a, double b) {
+inline double uniform(double a, double b) {
     return a + (b-a) * random();
 }
 
 /**
  * Integer in [a, b)
  */
-int randint(int a, int b) {
+inline int randint(int a, int b) {
     int delta = (b-a) * random();
     return a + delta;
 }
@@ -13,15 +13,29 @@ class Blocks(Effect):
     The blocks that fall down.
     """
 
+    def __init__(self, props, cache, libs, notes) -> None:
+        super().__init__(props, cache, libs, notes)
+
+        # Index of notes by time, see NoteIndex in pr_midi.hpp
+        starts = self.notes["start"]
+        self.index_order = np.argsort(starts, kind="stable").astype(Types.int)
+        self.index_starts = starts[self.index_order]
+        self.index_max_ends = np.maximum.accumulate(
+            self.notes["end"][self.index_order])
+
     def render(self, props, img: np.ndarray, frame: int):
         """
         Render the blocks.
-        :param notes: MIDI notes from parse_midi.
+        :param img: Raw image, float64 or float32.
         """
-        self.libs["blocks"].render_blocks(
+        lib = self.libs["blocks"]
+        func = lib.render_blocks_f if img.dtype == np.float32 else \
+            lib.render_blocks
+        func(
             img, img.shape[1], img.shape[0],
-            frame, self.notes_str,
+            frame, len(self.notes), self.notes,
+            self.index_order, self.index_starts, self.index_max_ends,
             props.video.fps, props.piano.black_width_fac, props.blocks.speed,
             props.blocks.color, props.blocks.radius, props.blocks.bottom_glow,
-            props.blocks.bottom_glow_len,
+            props.blocks.bottom_glow_len, self.threads,
         )
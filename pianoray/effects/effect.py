@@ -1,29 +1,49 @@
 import ctypes
 from pathlib import Path
-from typing import Mapping, Sequence
+from typing import Dict, Mapping
 
 import numpy as np
 
 from ..api.accessor import Accessor
-from ..cpp import Types
-from ..midi import Note, serialize_midi
+from ..buffers import BufferPool
+from ..midi import NOTE_DTYPE
 
 
 class Effect:
     """
     Base class for all effects.
+
+    Set ``stateful`` to True in subclasses whose output depends on previous
+    frames (e.g. a particle simulation). Frames of stateful effects can't be
+    split across processes, so ``render_frames`` falls back to rendering in
+    one process if any effect is stateful.
+
+    Take scratch images from ``pool`` and give them back after rendering.
+    The renderer replaces it with the pool it shares between effects.
+
+    Pass ``threads`` to C functions that render with several threads. The
+    renderer sets it, see ``FrameRenderer``.
+
+    ``notes`` is passed to C functions as is (``Note*``). Store per note
+    values of an effect in ``note_attrs``, as arrays with one row per note
+    named ``"effect.attr"``.
     """
+    stateful: bool = False
+    pool: BufferPool
+    threads: int = 1
+
     cache: Path
     libs: Mapping[str, ctypes.CDLL]
-    notes: Sequence[Note]
-    notes_str: np.ndarray
+    notes: np.ndarray  # Of NOTE_DTYPE
+    note_attrs: Dict[str, np.ndarray]
 
     def __init__(self, props: Accessor, cache: Path, libs,
-            notes: Sequence[Note]) -> None:
+            notes: np.ndarray) -> None:
         self.cache = cache
         self.libs = libs
-        self.notes = notes
-        self.notes_str = Types.cstr(serialize_midi(notes))
+        self.notes = np.ascontiguousarray(notes, dtype=NOTE_DTYPE)
+        self.note_attrs = {}
+        self.pool = BufferPool()
 
     def render(self, props: Accessor, img: np.ndarray, frame: int,
             *args, **kwargs) -> None:
@@ -13,14 +13,16 @@ class Glare(Effect):
     """
 
     def __init__(self, props, cache, libs, notes) -> None:
-        super().__init__(props, cache, libs)
+        super().__init__(props, cache, libs, notes)
 
-        for note in notes:
-            streaks = []
-            for _ in range(props.glare.streaks):
-                angle = random.randint(0, 255)
-                streaks.append(angle)
-            note.attrs["glare.streak_angles"] = streaks
+        # Columns in the types render_glare takes
+        self.keys = self.notes["note"].astype(Types.int)
+        self.starts = np.ascontiguousarray(self.notes["start"])
+        self.ends = np.ascontiguousarray(self.notes["end"])
+
+        self.note_attrs["glare.streak_angles"] = np.array(
+            [[random.randint(0, 255) for _ in range(props.glare.streaks)]
+                for _ in range(len(notes))], dtype=np.uint8)
 
     def render(self, props, img: np.ndarray, frame: int, notes):
         """
@@ -28,14 +30,6 @@ class Glare(Effect):
 
         :param notes: MIDI notes from parse_midi.
         """
-        keys = np.array([n.note for n in notes], dtype=Types.int)
-        starts = np.array([n.start for n in notes], dtype=Types.double)
-        ends = np.array([n.end for n in notes], dtype=Types.double)
-
-        angles = []
-        for note in notes:
-            angles.extend(note.attrs["glare.streak_angles"])
-        angles = np.array(angles, dtype=np.uint8)
 
         props_args = [props.piano.black_width_fac,
             props.glare.radius, props.glare.intensity,
@@ -44,6 +38,7 @@ class Glare(Effect):
         self.libs["glare"].render_glare(
             img, img.shape[1], img.shape[0],
             frame,
-            len(notes), keys, starts, ends, angles,
+            len(self.notes), self.keys, self.starts, self.ends,
+            self.note_attrs["glare.streak_angles"],
             *props_args,
         )
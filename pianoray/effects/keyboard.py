@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import Optional, Tuple
 
 import cv2
 import numpy as np
@@ -23,6 +23,10 @@ class VideoRead:
             ``(client_start, client_end, src_start, src_end)`` frames.
         """
         self._video = cv2.VideoCapture(path)
+        # Only an estimate, which can be too high or too low. Corrected
+        # by the frames actually read, and exact once a read fails.
+        self._count = int(self._video.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._exact = False
         self.mapping = mapping
 
         # _real_frame stores frame number with first frame of video = 0
@@ -38,6 +42,31 @@ class VideoRead:
         f = interp(frame, self.mapping[:2], self.mapping[2:])
         return round(f)
 
+    def source_index(self, frame: int) -> Optional[int]:
+        """
+        Index of the video frame ``read(frame)`` returns,
+        without reading it.
+
+        :return: Index, or None if it's past the frames known to exist,
+            where it isn't known which frame is returned.
+        """
+        f = self._get_frame(frame)
+        if f > self._count and not self._exact:
+            return None
+        return min(max(f, 1), self._count) - 1
+
+    def _update_count(self, ret: bool) -> None:
+        """
+        Correct the frame count after reading or grabbing a frame.
+
+        :param ret: Whether there was a frame.
+        """
+        if ret:
+            self._count = max(self._count, self._real_frame)
+        elif not self._exact:
+            self._count = self._real_frame - 1
+            self._exact = True
+
     def _read_next(self):
         """
         Read next frame, store in self._last, and
@@ -46,14 +75,29 @@ class VideoRead:
         ret, img = self._video.read()
         self._real_frame += 1
         if ret:
-            self._last = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            self._last = img
+        self._update_count(ret)
+
+    def _grab_next(self):
+        """
+        Skip the next frame. Decodes it without converting.
+        """
+        ret = self._video.grab()
+        self._real_frame += 1
+        self._update_count(ret)
 
     def read(self, frame: int) -> np.ndarray:
         """
         Read frame. Pass the frame the client needs.
         Can only read monotonically.
+
+        :return: BGR image, as decoded.
         """
         f = self._get_frame(frame)
+        # Frames that are skipped over are only grabbed. Frames near the
+        # end are always read, so the last frame is kept if f is past it.
+        while self._real_frame < min(f-1, self._count-2):
+            self._grab_next()
         while self._real_frame < f:
             self._read_next()
 
@@ -76,7 +120,7 @@ class Keyboard(Effect):
         vid.release()
 
         fps = props.video.fps
-        duration = notes[-1].start - notes[0].start
+        duration = notes["start"][-1] - notes["start"][0]
         self.video = VideoRead(props.keyboard.file, fps,
             (0, duration, props.keyboard.start*vid_fps, props.keyboard.end*vid_fps))
 
@@ -134,25 +178,48 @@ class Keyboard(Effect):
         self.dst_shape = (dst_width, dst_height)
         self.mask = mask
 
-    def render(self, props, img: np.ndarray, frame: int):
+    def source_index(self, frame: int) -> Optional[int]:
+        """
+        Index of the keyboard video frame shown at this frame, or None if
+        it isn't known yet. See ``VideoRead.source_index``.
+        """
+        return self.video.source_index(frame)
+
+    def read(self, frame: int) -> np.ndarray:
+        """
+        Read the keyboard video frame (BGR) shown at this frame.
+        Can only read monotonically.
+        """
+        return self.video.read(frame)
+
+    def render(self, props, img: np.ndarray, frame: int,
+            src: Optional[np.ndarray] = None):
         """
         Render the keyboard.
+
+        :param src: Keyboard video frame, from ``read``. Read if not given.
         """
         dst = self.dst_shape
 
-        kbd = self.video.read(frame)
-        kbd = cv2.warpPerspective(kbd, self.persp, dst).astype(np.float64)
+        shape = (dst[1], dst[0], 3)
+        warped = self.pool.take(shape, np.uint8)
+        kbd = self.pool.take(shape, np.float64)
+
+        src = self.read(frame) if src is None else src
+        cv2.warpPerspective(src, self.persp, dst, dst=warped)
+        kbd[...] = warped[..., ::-1]   # BGR to RGB
         kbd *= self.mask
 
         kbd *= props.keyboard.dim_mult
         kbd += props.keyboard.dim_add
-        kbd[kbd<0] = 0
-        kbd[kbd>255] = 255
-        kbd = kbd.astype(np.uint8)
+        np.clip(kbd, 0, 255, out=kbd)
 
         half = int(props.video.resolution[1] / 2)
         img[half:half+dst[1], 0:dst[0], ...] = kbd
 
+        self.pool.give(warped)
+        self.pool.give(kbd)
+
         """
         # Octave lines
         if props.keyboard.octave_lines:
@@ -14,7 +14,17 @@ from .effect import Effect
 class Particles(Effect):
     """
     Particles emit from keys.
+    Simulation state is carried from the previous frame.
     """
+    stateful = True
+
+    def __init__(self, props, cache, libs, notes) -> None:
+        super().__init__(props, cache, libs, notes)
+
+        # Columns in the types render_ptcls takes
+        self.keys = self.notes["note"].astype(Types.int)
+        self.starts = np.ascontiguousarray(self.notes["start"])
+        self.ends = np.ascontiguousarray(self.notes["end"])
 
     def render(self, props, img: np.ndarray, frame: int, notes):
         """
@@ -22,10 +32,6 @@ class Particles(Effect):
 
         :param notes: MIDI notes.
         """
-        keys = np.array([n.note for n in notes], dtype=Types.int)
-        starts = np.array([n.start for n in notes], dtype=Types.double)
-        ends = np.array([n.end for n in notes], dtype=Types.double)
-
         cache_in = self.cache / "ptcls" / strnum(frame-1)
         cache_out = self.cache / "ptcls" / strnum(frame)
         if not cache_in.is_file():
@@ -39,6 +45,6 @@ class Particles(Effect):
             img, img.shape[1], img.shape[0],
             frame,
             Types.cpath(cache_in), Types.cpath(cache_out),
-            len(notes), keys, starts, ends,
+            len(self.notes), self.keys, self.starts, self.ends,
             *props_args,
         )
@@ -0,0 +1,24 @@
+"""
+Hash of the C++ kernel sources, compiled into the prebuilt kernels.
+
+Only uses the standard library, as setup.py loads this file without
+importing PianoRay.
+"""
+
+import hashlib
+from pathlib import Path
+
+CPP_UTILS = Path(__file__).absolute().parent / "cutils"
+
+
+def source_hash(directory: Path = CPP_UTILS) -> str:
+    """
+    Hash of the names and contents of the C++ files in ``directory``.
+    """
+    hasher = hashlib.sha1()
+    for path in sorted(Path(directory).iterdir()):
+        if path.suffix in (".cpp", ".hpp"):
+            hasher.update(path.name.encode())
+            with open(path, "rb") as fp:
+                hasher.update(fp.read())
+    return hasher.hexdigest()
@@ -1,74 +1,122 @@
-import io
+import hashlib
 import os
-import struct
-from typing import Any, Mapping, Sequence
+from pathlib import Path
+from typing import Optional
 
-import mido
+import numpy as np
 
+# One note. start and end times are in frames.
+# Aligned like ``struct Note`` of pr_midi.hpp (24 bytes), so C functions
+# can read arrays of notes directly.
+NOTE_DTYPE = np.dtype([
+    ("start", "<f8"),
+    ("end", "<f8"),
+    ("note", "u1"),
+    ("velocity", "u1"),
+], align=True)
 
-class Note:
-    """
-    One note.
-    start and end times are in frames.
-    attrs is mapping of arbitrary attributes any effect can set.
-    """
-    note: int
-    velocity: int
-    start: float
-    end: float
-    attrs: Mapping[str, Any]
-
-    def __init__(self, note, velocity, start, end):
-        self.note = note
-        self.velocity = velocity
-        self.start = start
-        self.end = end
-        self.attrs = {}
+# Increment when parsing or NOTE_DTYPE changes, to invalidate cached notes.
+PARSER_VERSION = 2
 
 
-def parse_midi(props) -> Sequence[Note]:
+def parse_midi(props, cache: Optional[Path] = None) -> np.ndarray:
     """
     Parse midi file.
 
-    :return: List of ``(note, velocity, start_frame, end_frame)``.
+    Times are computed from ticks and the tempo map with integers, and
+    start at the first note. Notes are in order of their note off
+    messages, with the velocity of the note off message.
+
+    :param cache: Cache directory. Parsed notes are stored in
+        ``cache/midi``, keyed by the file contents and the props parsing
+        depends on, and reused.
+    :return: Structured array of ``NOTE_DTYPE``.
     """
     path = props.midi.file
-    min_len = props.midi.min_length * props.video.fps
-
-    midi = mido.MidiFile(path)
-    notes = []
-
-    t = 0
-    started = False
-    starts = [0] * 255
-    for msg in midi:
-        if started:  # Only increment after first note
-            t += msg.time * props.video.fps / props.midi.speed
-
-        if msg.type.startswith("note_"):
-            started = True
-
-            vel = msg.velocity
-            note = msg.note - 21
-            if msg.type == "note_on" and vel > 0:
-                starts[note] = t
-            else:
-                end = t if (t-starts[note]) > min_len else \
-                    starts[note] + min_len
-                notes.append(Note(note, vel, starts[note], end))
-
+    args = (props.midi.speed, props.midi.min_length, props.video.fps)
+    if cache is None:
+        return _parse(path, *args)
+
+    hasher = hashlib.sha1(repr((PARSER_VERSION, args)).encode())
+    with open(path, "rb") as fp:
+        hasher.update(fp.read())
+    cache_path = Path(cache) / "midi" / f"{hasher.hexdigest()}.npy"
+
+    if cache_path.is_file():
+        return np.load(cache_path)
+
+    notes = _parse(path, *args)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as fp:
+        np.save(fp, notes)
+    os.replace(tmp, cache_path)
     return notes
 
 
-def serialize_midi(notes) -> bytes:
+def _parse(path: str, speed: float, min_length: float,
+        fps: int) -> np.ndarray:
     """
-    Serialize according to description in docs.
+    Parse without the cache. See ``parse_midi``.
     """
-    data = io.BytesIO()
+    import mido
 
-    data.write(struct.pack("<I", len(notes)))
-    for n in notes:
-        data.write(struct.pack("<ddBB", n.start, n.end, n.note, n.velocity))
+    midi = mido.MidiFile(path)
+
+    # Note and tempo messages of all tracks as (tick, kind, note or tempo,
+    # velocity), kind 1 for note on, 0 for note off, -1 for tempo.
+    # Merged like mido.merge_tracks: sorted by tick, stable in track order.
+    events = []
+    for track in midi.tracks:
+        tick = 0
+        for msg in track:
+            tick += msg.time
+            if msg.type == "note_on" and msg.velocity > 0:
+                events.append((tick, 1, msg.note, msg.velocity))
+            elif msg.type.startswith("note_"):
+                events.append((tick, 0, msg.note, msg.velocity))
+            elif msg.type == "set_tempo":
+                events.append((tick, -1, msg.tempo, 0))
+    events = np.array(events, dtype=np.int64).reshape(-1, 4)
+    events = events[np.argsort(events[:, 0], kind="stable")]
+    ticks, kinds, values, vels = events.T
+
+    # Microseconds times ticks per beat since the start, exact in integers.
+    # A tempo applies to the ticks after its message.
+    tempos = np.concatenate(([500000], values[kinds == -1]))
+    tempo_ticks = np.concatenate(([0], ticks[kinds == -1]))
+    seg_us = np.concatenate(([0], np.cumsum(np.diff(tempo_ticks)
+        * tempos[:-1])))
+    seg = np.searchsorted(tempo_ticks, ticks, side="right") - 1
+    us = seg_us[seg] + (ticks-tempo_ticks[seg]) * tempos[seg]
+
+    is_note = kinds >= 0
+    us, kinds, keys, vels = us[is_note], kinds[is_note], values[is_note], \
+        vels[is_note]
+    if len(us) == 0:
+        return np.zeros(0, dtype=NOTE_DTYPE)
+    frames = (us-us[0]) * fps / (1e6 * midi.ticks_per_beat * speed)
+
+    # Start of each note off: the last note on of the same key before it,
+    # or frame 0 if none. Sort by key (stably), then take the running max
+    # of positions of note ons, which is valid if it's in the same key.
+    order = np.argsort(keys, kind="stable")
+    pos = np.arange(len(order))
+    last_on = np.maximum.accumulate(np.where(kinds[order] == 1, pos, -1))
+    first = np.concatenate(([True], np.diff(keys[order]) != 0))
+    key_start = np.maximum.accumulate(np.where(first, pos, 0))
+    starts = np.where(last_on >= key_start, frames[order][last_on], 0)
+    start_of = np.empty(len(order))
+    start_of[order] = starts
+
+    off = kinds == 0
+    notes = np.empty(off.sum(), dtype=NOTE_DTYPE)
+    start = start_of[off]
+    end = frames[off]
+    min_len = min_length * fps
+    notes["start"] = start
+    notes["end"] = np.where(end-start > min_len, end, start + min_len)
+    notes["note"] = keys[off] - 21
+    notes["velocity"] = vels[off]
+    return notes
 
-    data.seek(0)
-    return data.read()
@@ -3,33 +3,115 @@ Compositing (post processing) the rendered image.
 Also arbitrary small rendering functions.
 """
 
+from functools import lru_cache
+
 import cv2
 import numpy as np
 
+from .. import logger
 from ..utils import bounds
 
 
-def composite(libs, props, raw_img):
+def _reinhard(x):
+    return x / (1+x)
+
+
+def _aces(x):
+    """
+    Narkowicz's fit of the ACES filmic curve.
+    """
+    return np.clip(x * (2.51*x + 0.03) / (x * (2.43*x + 0.59) + 0.14), 0, 1)
+
+
+# Tone curves, brightness (shutter times raw value, 0 to infinity) to
+# 0 to 1. Selected with the ``comp.tone_curve`` prop.
+TONE_CURVES = {
+    "tanh": np.tanh,
+    "reinhard": _reinhard,
+    "aces": _aces,
+}
+
+# Initial number of entries of a tone curve LUT. Doubled until its max
+# error is at most LUT_TOLERANCE, in 8-bit levels.
+LUT_SIZE = 4096
+LUT_TOLERANCE = 1e-3
+
+
+def _lut_values(func, t):
     """
-    Convert raw image (float64) into actual image (int8).
+    Tone curve at ``t = u / (1+u)`` of brightness ``u``, in 8-bit levels.
+    """
+    with np.errstate(divide="ignore"):
+        u = np.where(t < 1, t / (1-t), np.inf)
+    # The limit at infinity.
+    u = np.minimum(u, 1e12)
+    return 255 * func(u)
+
+
+@lru_cache(maxsize=None)
+def tone_lut(curve: str) -> np.ndarray:
+    """
+    Lookup table of a tone curve for the composite C function, evenly
+    spaced in ``t = u / (1+u)`` of brightness ``u``, so it covers all
+    brightnesses.
+
+    The error of interpolating the table is checked against the exact curve
+    at points between the entries. Logs the size and max error.
+
+    :param curve: Name in ``TONE_CURVES``.
+    :return: float32 array, with a copy of the last entry appended.
+    """
+    if curve not in TONE_CURVES:
+        raise ValueError(f"Unknown tone curve {curve}, expected one of "
+            f"{', '.join(TONE_CURVES)}.")
+    func = TONE_CURVES[curve]
+
+    size = LUT_SIZE
+    while True:
+        lut = _lut_values(func, np.linspace(0, 1, size)).astype(np.float32)
+
+        # 16 points in each interval.
+        t = np.linspace(0, 1, (size-1) * 16 + 1)
+        x = t * (size-1)
+        i = np.minimum(x.astype(int), size-2)
+        approx = lut[i] + (x-i) * (lut[i+1]-lut[i])
+        error = np.max(np.abs(approx - _lut_values(func, t)))
+
+        if error <= LUT_TOLERANCE or size >= 2**20:
+            break
+        size *= 2
+
+    logger.info(f"Tone curve {curve}: {size} entries, max error "
+        f"{error:.1e} levels.")
+    return np.append(lut, lut[-1])
+
+
+def composite(libs, props, raw_img, out=None, threads: int = 1):
+    """
+    Convert raw image (float64 or float32) into actual image (int8).
     Also adds some effects e.g. glare.
     Will change ``raw_img``.
+
+    :param out: Write the image here (uint8, same shape as ``raw_img``).
+        Allocated if not given.
+    :param threads: Number of threads of the C function.
     """
-    img = np.empty_like(raw_img, dtype=np.uint8)
+    img = np.empty_like(raw_img, dtype=np.uint8) if out is None else out
+    lut = tone_lut(props.comp.tone_curve)
 
-    libs["composite"].composite(
+    lib = libs["composite"]
+    func = lib.composite_f if raw_img.dtype == np.float32 else lib.composite
+    func(
         raw_img, img, img.shape[1], img.shape[0],
-        props.comp.shutter,
+        props.comp.shutter, lut, len(lut)-1, threads,
     )
 
     return img
 
 
-def add_fade(props, img, frame_start, frame_end, frame):
+def fade_factor(props, frame_start, frame_end, frame) -> float:
     """
-    Add intro outro fade and blur as a post processing step.
-
-    :param img: Dtype uint8, call this function after compositing.
+    Brightness multiplier of the intro outro fade, from 0 to 1.
     """
     fps = props.video.fps
     fade_in = frame_start + props.comp.fade_in * fps
@@ -40,10 +122,19 @@ def add_fade(props, img, frame_start, frame_end, frame):
         fade_fac *= np.interp(frame, (frame_start, fade_in), (0, 1))
     if frame >= fade_out:
         fade_fac *= np.interp(frame, (fade_out, frame_end), (1, 0))
-    fade_fac = bounds(fade_fac, 0, 1)
+    return bounds(fade_fac, 0, 1)
+
+
+def add_fade(props, img, frame_start, frame_end, frame):
+    """
+    Add intro outro fade and blur as a post processing step.
+
+    :param img: Dtype uint8, call this function after compositing.
+    """
+    fade_fac = fade_factor(props, frame_start, frame_end, frame)
 
     if fade_fac < 1:
         blur = int(props.comp.fade_blur * (1-fade_fac))
-        img[...] = (img * fade_fac).astype(np.uint8)
+        np.multiply(img, fade_fac, out=img, casting="unsafe")
         if blur > 0:
-            img[...] = cv2.blur(img, (blur, blur))
+            cv2.blur(img, (blur, blur), dst=img)
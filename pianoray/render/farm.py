@@ -0,0 +1,228 @@
+"""
+Render farm: several nodes rendering one video through a shared directory.
+"""
+
+import json
+import os
+import socket
+import time
+from pathlib import Path
+from threading import Thread
+from typing import List, Optional
+
+from .. import logger
+
+
+class Farm:
+    """
+    Work queue of frame chunks in a shared (e.g. NFS) directory.
+
+    Files in the farm directory:
+
+    - ``farm.json``: Scene fingerprint, frame count and chunk size. Written by
+      the first node, checked by the others.
+    - ``leases/N``: Chunk ``N`` is being rendered. A thread of the node
+      refreshes the file's modification time, and the lease expires if it
+      isn't refreshed for ``lease_time`` seconds (e.g. the node crashed).
+    - ``segments/N.mp4``: Encoded video of finished chunk ``N``.
+    - ``work/NODE``: Temporary files of each node.
+    - ``join``: Lease of the node which joins the segments.
+    - ``done``: Segments were joined.
+
+    Claims rely on ``O_EXCL`` file creation, ``rename`` and ``link`` being
+    atomic.
+    """
+
+    def __init__(self, root: Path, fingerprint: str,
+            lease_time: float = 120) -> None:
+        """
+        :param root: Farm directory, shared by all nodes.
+        :param fingerprint: Scene fingerprint. All nodes must render the
+            same scene.
+        :param lease_time: Seconds until a lease that isn't refreshed expires.
+        """
+        self.root = root
+        self.fingerprint = fingerprint
+        self.lease_time = lease_time
+        self.node = f"{socket.gethostname()}-{os.getpid()}"
+
+        self.frames = None
+        self.chunk = None
+        self._lease = None
+
+        Thread(target=self._heartbeat, daemon=True).start()
+
+        for sub in ("leases", "segments", "work"):
+            (root/sub).mkdir(parents=True, exist_ok=True)
+        self.work = root / "work" / self.node
+        self.work.mkdir(exist_ok=True)
+
+    def setup(self, frames: int, chunk: int) -> None:
+        """
+        Create the farm, or join an existing one.
+
+        :param frames: Number of frames of the video.
+        :param chunk: Frames per chunk, if creating the farm.
+        """
+        info = {"fingerprint": self.fingerprint, "frames": frames,
+            "chunk": chunk}
+        path = self.root / "farm.json"
+        tmp = self.work / "farm.json"
+        with open(tmp, "w") as fp:
+            json.dump(info, fp)
+
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            with open(path, "r") as fp:
+                info = json.load(fp)
+            if info["fingerprint"] != self.fingerprint:
+                raise ValueError(f"Farm {self.root} is rendering a different "
+                    "scene.")
+        os.unlink(tmp)
+
+        self.frames = info["frames"]
+        self.chunk = info["chunk"]
+        logger.info(f"Node {self.node} joined farm {self.root}")
+
+    @property
+    def num_chunks(self) -> int:
+        return (self.frames + self.chunk - 1) // self.chunk
+
+    def chunk_range(self, chunk: int) -> range:
+        """
+        Frame indices (0 is the first frame of the video) of a chunk.
+        """
+        start = chunk * self.chunk
+        return range(start, min(start+self.chunk, self.frames))
+
+    def segment(self, chunk: int) -> Path:
+        return self.root / "segments" / f"{chunk}.mp4"
+
+    def _create(self, path: Path) -> bool:
+        """
+        Atomically create a lease file.
+
+        :return: Whether this node created it.
+        """
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.write(fd, self.node.encode())
+        os.close(fd)
+        return True
+
+    def _try_lease(self, path: Path) -> bool:
+        """
+        Claim a lease, reclaiming it if it expired.
+        """
+        if self._create(path):
+            return True
+
+        try:
+            age = time.time() - path.stat().st_mtime
+        except FileNotFoundError:
+            return self._create(path)
+        if age < self.lease_time:
+            return False
+
+        # Only one node can rename the expired lease away.
+        stale = path.with_name(f"{path.name}.{self.node}.stale")
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return False
+
+        # Another node may have reclaimed it since we checked, and we
+        # renamed its fresh lease. Put it back, unless yet another node
+        # created one meanwhile (link doesn't replace it).
+        if time.time() - stale.stat().st_mtime < self.lease_time:
+            try:
+                os.link(stale, path)
+            except FileExistsError:
+                pass
+            os.unlink(stale)
+            return False
+
+        logger.warn(f"Reclaiming expired lease {path.name}")
+        os.unlink(stale)
+        return self._create(path)
+
+    def claim(self) -> Optional[int]:
+        """
+        Claim the first chunk that isn't finished or leased.
+
+        :return: Chunk number, or None if there are none.
+        """
+        for chunk in range(self.num_chunks):
+            if self.segment(chunk).is_file():
+                continue
+            lease = self.root / "leases" / str(chunk)
+            if self._try_lease(lease):
+                # The chunk may have finished while claiming.
+                if self.segment(chunk).is_file():
+                    lease.unlink()
+                    continue
+                self._lease = lease
+                return chunk
+
+        return None
+
+    def _heartbeat(self) -> None:
+        """
+        Refresh the current lease periodically. Runs in a daemon thread,
+        so it stops when the node dies.
+        """
+        while True:
+            time.sleep(self.lease_time / 4)
+            lease = self._lease
+            if lease is not None:
+                try:
+                    os.utime(lease)
+                except FileNotFoundError:
+                    # Lease was reclaimed, or the chunk just finished.
+                    # Keep going, both nodes produce the same segment.
+                    pass
+
+    def complete(self, chunk: int, video: Path) -> None:
+        """
+        Store the encoded segment of a chunk and release its lease.
+        """
+        os.replace(video, self.segment(chunk))
+        self._lease = None
+        (self.root / "leases" / str(chunk)).unlink(missing_ok=True)
+
+    def finished(self) -> bool:
+        """
+        Whether all chunks are finished.
+        """
+        return all(self.segment(c).is_file() for c in range(self.num_chunks))
+
+    def segments(self) -> List[Path]:
+        return [self.segment(c) for c in range(self.num_chunks)]
+
+    def joined(self) -> bool:
+        """
+        Whether the segments were joined.
+        """
+        return (self.root / "done").is_file()
+
+    def claim_join(self) -> bool:
+        """
+        Claim joining the segments. Only one node gets it, unless it
+        doesn't finish within ``lease_time``.
+        """
+        if self.joined():
+            return False
+        if self._try_lease(self.root / "join"):
+            self._lease = self.root / "join"
+            return True
+        return False
+
+    def release_join(self) -> None:
+        """
+        Mark the farm as done after joining.
+        """
+        self._create(self.root / "done")
+        self._lease = None
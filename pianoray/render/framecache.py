@@ -0,0 +1,143 @@
+"""
+Content addressed cache of rendered frames.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+import cv2
+import numpy as np
+
+from ..kernel_sources import source_hash
+from ..utils import VERSION
+
+
+def hash_value(hasher, value: Any) -> None:
+    """
+    Feed a (possibly nested) value into a hashlib object.
+    Handles dicts, sequences, numpy arrays and scalars.
+    """
+    if isinstance(value, dict):
+        hasher.update(b"{")
+        for k in sorted(value):
+            hasher.update(repr(k).encode())
+            hash_value(hasher, value[k])
+        hasher.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        hasher.update(b"[")
+        for v in value:
+            hash_value(hasher, v)
+        hasher.update(b"]")
+    elif isinstance(value, np.ndarray):
+        hasher.update(f"array{value.dtype}{value.shape}".encode())
+        hasher.update(np.ascontiguousarray(value).tobytes())
+    else:
+        hasher.update(f"{type(value).__name__}:{value!r};".encode())
+
+
+def kernels_hash() -> str:
+    """
+    Hash of the C sources and the PianoRay version.
+    Changes whenever rendering code may have changed.
+    """
+    return hashlib.sha1((VERSION + source_hash()).encode()).hexdigest()
+
+
+class FrameCache:
+    """
+    Stores rendered frames as PNG files named by the hash of everything the
+    frame depends on. Used to skip drawing frames which didn't change since
+    a previous render.
+
+    Cached frames are evicted least recently used first once the total size
+    exceeds ``max_size``.
+    """
+
+    def __init__(self, cache: Path, max_size: int, salt: Any = None) -> None:
+        """
+        :param cache: Directory to store frames in.
+        :param max_size: Max total size in bytes.
+        :param salt: Extra value added to every key, e.g. input file info.
+        """
+        self.cache = cache
+        self.max_size = max_size
+        self.cache.mkdir(parents=True, exist_ok=True)
+
+        hasher = hashlib.sha1(kernels_hash().encode())
+        hash_value(hasher, salt)
+        self._base = hasher
+
+    def key(self, *values) -> str:
+        """
+        Hash of given values, plus the kernel versions and salt.
+        """
+        hasher = self._base.copy()
+        for v in values:
+            hash_value(hasher, v)
+        return hasher.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache / f"{key}.png"
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Get a cached frame, and mark it as recently used.
+
+        :return: Image, or None if not cached.
+        """
+        path = self._path(key)
+        try:
+            data = np.fromfile(path, dtype=np.uint8)
+            os.utime(path)
+        except OSError:
+            return None
+
+        return cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+
+    def put(self, key: str, img: np.ndarray) -> None:
+        """
+        Store a frame.
+        Written to a temporary file first, so other processes never read a
+        partial file.
+        """
+        ret, data = cv2.imencode(".png", img, (cv2.IMWRITE_PNG_COMPRESSION, 1))
+        if not ret:
+            return
+
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        data.tofile(tmp)
+        os.replace(tmp, path)
+
+    def evict(self) -> int:
+        """
+        Delete least recently used frames until the total size is at most
+        ``max_size``.
+
+        :return: Number of frames deleted.
+        """
+        files = []
+        total = 0
+        for path in self.cache.glob("*.png"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        files.sort()
+        count = 0
+        for mtime, size, path in files:
+            if total <= self.max_size:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            total -= size
+            count += 1
+
+        return count
@@ -0,0 +1,141 @@
+"""
+Render journal, used to resume interrupted renders.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Set
+
+from .framecache import hash_value, kernels_hash
+
+
+def scene_fingerprint(scene, *extra) -> str:
+    """
+    Hash of everything that affects the rendered frames of a scene:
+    all prop values and keyframes, input files, and rendering code version.
+
+    :param extra: Other values to include, e.g. render settings.
+    """
+    hasher = hashlib.sha1(kernels_hash().encode())
+    hash_value(hasher, extra)
+
+    for gname, pgroup in sorted(scene._pgroups.items()):
+        for pname, prop in sorted(pgroup._props.items()):
+            keyframes = [(k.frame, k.value, k.interp) for k in prop._keyframes]
+            mods = [type(m).__name__ for m in prop.mods]
+            hash_value(hasher,
+                (gname, pname, prop._value, prop.default, keyframes, mods))
+
+    props = scene.default
+    with open(props.midi.file, "rb") as fp:
+        hasher.update(fp.read())
+    stat = os.stat(props.keyboard.file)
+    hash_value(hasher, (props.keyboard.file, stat.st_size, stat.st_mtime_ns))
+
+    return hasher.hexdigest()
+
+
+def frame_complete(path: Path) -> bool:
+    """
+    Whether a saved JPEG frame is complete, i.e. it exists and ends with the
+    JPEG end of image marker.
+    """
+    try:
+        with open(path, "rb") as fp:
+            fp.seek(0, os.SEEK_END)
+            if fp.tell() < 2:
+                return False
+            fp.seek(-2, os.SEEK_END)
+            return fp.read() == b"\xff\xd9"
+    except OSError:
+        return False
+
+
+class Journal:
+    """
+    Append only log of finished frames.
+
+    The first line is the fingerprint of the scene. Each following line is
+    the index of a frame which was completely written. Frames may finish in
+    any order. Lines are synced to disk in batches, so a crash loses at most
+    the last batch, and those frames are rendered again.
+    """
+
+    def __init__(self, path: Path, fingerprint: str, batch: int = 32) -> None:
+        """
+        :param path: Journal file.
+        :param fingerprint: Scene fingerprint, see ``scene_fingerprint``.
+        :param batch: Sync to disk after this many frames.
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self.batch = batch
+
+        self._fp = None
+        self._pending = 0
+
+    def load(self) -> Set[int]:
+        """
+        Read finished frames of the previous render.
+
+        :return: Frame indices, or empty set if there is no journal or it
+            belongs to a different scene.
+        """
+        try:
+            with open(self.path, "r") as fp:
+                data = fp.read()
+        except OSError:
+            return set()
+
+        lines = data.split("\n")
+        if lines[0] != f"fingerprint {self.fingerprint}":
+            return set()
+
+        # Last line is either empty or partially written.
+        return {int(l) for l in lines[1:-1] if l.isdigit()}
+
+    def open(self, resume: bool) -> None:
+        """
+        Open for appending.
+
+        :param resume: Keep entries of the previous render. Otherwise, the
+            journal is cleared.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resume:
+            with open(self.path, "rb") as fp:
+                fp.seek(0, os.SEEK_END)
+                fp.seek(fp.tell()-1)
+                partial = fp.read() != b"\n"
+
+            self._fp = open(self.path, "a")
+            if partial:
+                self._fp.write("\n")
+        else:
+            self._fp = open(self.path, "w")
+            self._fp.write(f"fingerprint {self.fingerprint}\n")
+            self.sync()
+
+    def add(self, index: int) -> None:
+        """
+        Record that a frame is finished.
+        """
+        self._fp.write(f"{index}\n")
+        self._pending += 1
+        if self._pending >= self.batch:
+            self.sync()
+
+    def sync(self) -> None:
+        """
+        Flush and fsync the journal.
+        """
+        self._fp.flush()
+        os.fsync(self._fp.fileno())
+        self._pending = 0
+
+    def close(self) -> None:
+        if self._fp is not None:
+            self.sync()
+            self._fp.close()
+            self._fp = None
@@ -0,0 +1,153 @@
+"""
+Threaded pipeline of render stages.
+"""
+
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from typing import Any, Callable, Iterable, Iterator, List, Sequence, Tuple
+
+# Marks the end of input in a queue.
+_DONE = object()
+
+
+class _Error:
+    """
+    Exception raised in a stage, passed down to the consumer.
+    """
+
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+
+class Pipeline:
+    """
+    Runs each stage in its own thread. Stages are linked by bounded queues,
+    so a fast stage blocks when it gets too far ahead.
+
+    The first stage reads from ``source``, each other stage reads the
+    previous stage's results. Iterate over the pipeline to get results of
+    the last stage, in order.
+
+    The depth of each stage's input queue is sampled whenever the stage
+    takes an item. A queue that is usually full means the stage reading it
+    is the bottleneck; a queue that is usually empty means a stage before it
+    is.
+    """
+
+    def __init__(self, source: Iterable, stages: Sequence[Tuple[str, Callable]],
+            depth: int = 4) -> None:
+        """
+        :param source: Inputs of the first stage.
+        :param stages: Sequence of ``(name, function)``. Each function takes
+            one item and returns one item.
+        :param depth: Max items in each queue.
+        """
+        self.source = source
+        self.stages = stages
+        self.depth = depth
+
+        # _queues[i] is the input of stage i+1. The last is the output.
+        self._queues = [Queue(depth) for _ in stages]
+        self._stop = Event()
+        self._samples = [[0, 0, 0] for _ in stages]  # Sum, max, count
+
+    def _put(self, queue: Queue, item: Any) -> bool:
+        """
+        Put, giving up if the pipeline is stopped.
+        """
+        while not self._stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _get(self, i: int) -> Any:
+        """
+        Get the next input of stage i (i >= 1), recording the queue depth.
+        """
+        queue = self._queues[i-1]
+        depth = queue.qsize()
+        sample = self._samples[i]
+        sample[0] += depth
+        sample[1] = max(sample[1], depth)
+        sample[2] += 1
+
+        while not self._stop.is_set():
+            try:
+                return queue.get(timeout=0.1)
+            except Empty:
+                pass
+        return _DONE
+
+    def _inputs(self, i: int) -> Iterator:
+        """
+        Inputs of stage i, until the end or an error.
+        """
+        if i == 0:
+            yield from self.source
+            return
+
+        while True:
+            item = self._get(i)
+            if item is _DONE:
+                return
+            if isinstance(item, _Error):
+                self._put(self._queues[i], item)
+                return
+            yield item
+
+    def _run(self, i: int) -> None:
+        """
+        Thread target of stage i.
+        """
+        func = self.stages[i][1]
+        out = self._queues[i]
+        try:
+            for item in self._inputs(i):
+                if not self._put(out, func(item)):
+                    return
+            self._put(out, _DONE)
+        except BaseException as exc:
+            self._put(out, _Error(exc))
+
+    def __iter__(self) -> Iterator:
+        threads = [Thread(target=self._run, args=(i,), daemon=True,
+            name=f"pipeline-{name}") for i, (name, _) in enumerate(self.stages)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._queues[-1].get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _Error):
+                    raise item.exc
+                yield item
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+    def depths(self) -> str:
+        """
+        Current depth of each stage's input queue.
+        """
+        return " ".join(f"{name}={self._queues[i-1].qsize()}"
+            for i, (name, _) in enumerate(self.stages) if i > 0)
+
+    def report(self) -> List[Tuple[str, float, int]]:
+        """
+        Queue depth statistics.
+
+        :return: ``(stage name, average depth, max depth)`` of each stage's
+            input queue, except the first stage's.
+        """
+        ret = []
+        for i, (name, _) in enumerate(self.stages):
+            total, peak, count = self._samples[i]
+            if i > 0 and count > 0:
+                ret.append((name, total/count, peak))
+        return ret
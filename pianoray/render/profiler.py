@@ -0,0 +1,152 @@
+"""
+Timing of render stages.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from time import perf_counter_ns
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .. import logger
+
+_NULL = nullcontext()
+
+
+def _thread_name() -> str:
+    """
+    Name of the current thread, or of the process in worker processes.
+    """
+    process = multiprocessing.current_process()
+    if multiprocessing.parent_process() is not None:
+        return process.name
+    return threading.current_thread().name
+
+
+class Profiler:
+    """
+    Records how long each stage of each frame takes.
+
+    Wrap each stage in ``span``. Spans of worker processes are collected with
+    ``take`` and added to the main process's profiler with ``merge``.
+
+    A disabled profiler records nothing, and ``span`` costs about as much as
+    an empty ``with``.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+
+        # (stage, pid, tid, start ns, duration ns, frame)
+        self.events: List[Tuple] = []
+        # (pid, tid) to thread name
+        self.threads: Dict[Tuple[int, int], str] = {}
+
+    def span(self, stage: str, frame: Optional[int] = None):
+        """
+        Context manager timing one stage.
+
+        :param frame: Frame the stage is working on, shown in the trace.
+        """
+        if not self.enabled:
+            return _NULL
+        return self._span(stage, frame)
+
+    @contextmanager
+    def _span(self, stage, frame):
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = perf_counter_ns()
+            pid, tid = os.getpid(), threading.get_ident()
+            if (pid, tid) not in self.threads:
+                self.threads[pid, tid] = _thread_name()
+            self.events.append((stage, pid, tid, start, end-start, frame))
+
+    def take(self) -> Tuple[List, Dict]:
+        """
+        Remove and return the recorded spans, to pass them to ``merge``.
+        """
+        events, self.events = self.events, []
+        return events, dict(self.threads)
+
+    def merge(self, taken: Tuple[List, Dict]) -> None:
+        """
+        Add spans returned by ``take`` of another profiler.
+        """
+        events, threads = taken
+        self.events.extend(events)
+        self.threads.update(threads)
+
+    def stats(self) -> List[Tuple[str, int, float, float, float, float]]:
+        """
+        Statistics of each stage, most total time first.
+
+        :return: ``(stage, count, total, p50, p95, max)``, times in ms.
+        """
+        durations = {}
+        for stage, _, _, _, dur, _ in self.events:
+            durations.setdefault(stage, []).append(dur)
+
+        ret = []
+        for stage, durs in durations.items():
+            durs = np.array(durs) / 1e6
+            ret.append((stage, len(durs), durs.sum(),
+                *np.percentile(durs, (50, 95)), durs.max()))
+        ret.sort(key=lambda s: -s[2])
+        return ret
+
+    def table(self) -> str:
+        """
+        Statistics of each stage as a text table.
+        """
+        lines = [f"{'stage':<16}{'count':>8}{'total ms':>12}{'p50 ms':>10}"
+            f"{'p95 ms':>10}{'max ms':>10}"]
+        for stage, count, total, p50, p95, peak in self.stats():
+            lines.append(f"{stage:<16}{count:>8}{total:>12.1f}{p50:>10.2f}"
+                f"{p95:>10.2f}{peak:>10.2f}")
+        return "\n".join(lines) + "\n"
+
+    def write_trace(self, path: Path) -> None:
+        """
+        Write spans as a Chrome trace (JSON), which can be opened in
+        ``chrome://tracing`` or Perfetto.
+        """
+        start = min((e[3] for e in self.events), default=0)
+        trace = []
+        for (pid, tid), name in self.threads.items():
+            trace.append({"name": "thread_name", "ph": "M", "pid": pid,
+                "tid": tid, "args": {"name": name}})
+        for stage, pid, tid, begin, dur, frame in self.events:
+            event = {"name": stage, "ph": "X", "pid": pid, "tid": tid,
+                "ts": (begin-start) / 1e3, "dur": dur / 1e3}
+            if frame is not None:
+                event["args"] = {"frame": frame}
+            trace.append(event)
+
+        with open(path, "w") as fp:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, fp)
+
+    def save(self, path: Path) -> None:
+        """
+        Write the trace to ``path`` and the table next to it
+        (``.summary.txt``, replacing its suffix), and log a short summary.
+        """
+        path = Path(path)
+        table = path.with_suffix(".summary.txt")
+        self.write_trace(path)
+        with open(table, "w") as fp:
+            fp.write(self.table())
+
+        stats = self.stats()
+        total = sum(s[2] for s in stats) or 1
+        summary = ", ".join(f"{stage} {t/total:.0%} (p95 {p95:.1f} ms)"
+            for stage, _, t, _, p95, _ in stats[:4])
+        logger.info(f"Profile: {summary}")
+        logger.info(f"Trace saved to {path}, table to {table}")
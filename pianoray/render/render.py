@@ -3,54 +3,55 @@ Rendering pipeline.
 """
 
 import ctypes
-import json
+import hashlib
+import multiprocessing
 import os
+import time
 from pathlib import Path
-from typing import Mapping
+from typing import Mapping, Optional, Sequence, Set, Tuple
 
 import cv2
 import numpy as np
-from tqdm import trange
+from tqdm import tqdm
 
 from .. import logger
+from ..api.accessor import Accessor
+from ..api.timeline import Timeline
+from ..buffers import BufferPool
 from ..cpp import Types, load_libs
-from ..midi import parse_midi, serialize_midi
+from ..midi import parse_midi
 from ..effects import Blocks, Keyboard, Glare, Particles
-from .composite import add_fade, composite
-from .video import Video
+from .composite import add_fade, composite, fade_factor, tone_lut
+from .farm import Farm
+from .framecache import FrameCache, hash_value
+from .journal import Journal, frame_complete, scene_fingerprint
+from .pipeline import Pipeline
+from .profiler import Profiler
+from .video import Video, frame_path
 
 
-def check_previous(args, settings, cache):
+def check_previous(args, journal: Journal, output: Path) -> Set[int]:
     """
     Check if continue previous render.
+    Frames whose files are missing or truncated are not counted as finished.
 
-    :return: Frame to start rendering from.
+    :param output: Cache directory of the video, with the saved frames.
+    :return: Indices of finished frames to skip.
     """
-    cache_settings = cache / "settings.json"
-    cache_curr = cache / "currently_rendering.txt"
+    done = journal.load()
+    done = {i for i in done if frame_complete(frame_path(output, i))}
 
-    real_start = None
-    if cache_settings.is_file() and cache_curr.is_file():
-        with open(cache_settings, "r") as fp:
-            prev_sets = Settings(json.load(fp))  # TODO change
+    if done:
+        if args.resume is None:
+            print("Last render has same settings as this render, "
+                  f"and finished {len(done)} frames.")
+            if input("Continue last render? [Y/n] ").lower().strip() == "n":
+                done = set()
 
-        if prev_sets == settings:
-            with open(cache_curr, "r") as fp:
-                data = fp.read()
-                real_start = int(data) if data.isdigit() else None
+        elif not args.resume:
+            done = set()
 
-            if real_start is not None:
-                if args.resume is None:
-                    print("Last render has same settings as this render, "
-                          f"and stopped at frame {real_start}.")
-                    if input("Continue last render? [Y/n] ").lower().strip() \
-                            == "n":
-                        real_start = None
-
-                elif not args.resume:
-                    real_start = None
-
-    return real_start
+    return done
 
 
 def render_video(args, scene, out: str, cache: Path) -> None:
@@ -68,21 +69,120 @@ def render_video(args, scene, out: str, cache: Path) -> None:
 
     # Cache subdirs
     for sub in ("glare", "ptcls"):
-        (cache/sub).mkdir(exist_ok=True)
+        (cache/sub).mkdir(parents=True, exist_ok=True)
+
+    stride = 1
+    preset = None
+    if args.draft:
+        apply_draft(scene, args.draft_scale)
+        stride = args.draft_stride
+        preset = "ultrafast"
+
+    props = scene.default
 
-    # Save settings to cache.
+    frame_cache = None
+    if args.frame_cache > 0:
+        # Keyboard video may be replaced at the same path.
+        stat = os.stat(props.keyboard.file)
+        salt = (props.keyboard.file, stat.st_size, stat.st_mtime_ns)
+        frame_cache = FrameCache(cache / "frame_cache",
+            args.frame_cache * 2**20, salt)
+
+    window = get_window(args, props.video.fps / stride,
+        video_frames(scene, cache, stride))
+    if args.join:
+        join_segments(scene, args.join, out, cache, window, stride)
+        return
+
+    if args.farm is not None:
+        if window is not None:
+            raise ValueError("--frames and --seconds can't be used with --farm")
+        render_farm(args, scene, out, cache, libs, frame_cache, stride)
+        return
+
+    # Resuming needs the frames of the previous render, which are only
+    # saved with save_frames.
+    output = cache / "output"
+    window_key = None if window is None else (window.start, window.stop)
+    journal = Journal(output / "journal.txt",
+        scene_fingerprint(scene, stride, args.precision, window_key))
+    done = check_previous(args, journal, output)
+    save_frames = bool(done) or args.save_frames
+    if not save_frames:
+        journal = None
+    video = Video(output, props, save_frames, args.encoders, stride, preset)
+
+    start = render_frames(scene, libs, video, cache, done, args.jobs,
+        frame_cache, journal, stride, args.precision, args.check_precision,
+        args.profile, window, args.threads).start
+    video.compile(out, props, start=start)
+
+
+def get_window(args, fps: float, num_frames: int) -> Optional[slice]:
     """
-    os.makedirs(cache, exist_ok=True)
-    real_start = check_previous(args, settings, cache)
-    with open(cache / "settings.json", "w") as fp:
-        json.dump(settings._json(), fp)
+    Video frames to render, from ``--frames`` or ``--seconds``.
+
+    :param fps: Frame rate of the video.
+    :param num_frames: Number of frames of the whole video.
+    :return: Slice of video frame indices, or None for the whole video.
+    """
+    if args.frames is not None:
+        text, parse = args.frames, int
+    elif args.seconds is not None:
+        text, parse = args.seconds, lambda s: round(float(s) * fps)
+    else:
+        return None
+
+    try:
+        start, end = text.split(":")
+        start = parse(start) if start else None
+        end = parse(end) if end else None
+    except ValueError:
+        raise ValueError(f"Invalid range {text}, expected START:END")
+    if (start or 0) < 0 or (end or 0) < 0:
+        raise ValueError(f"Invalid range {text}, must not be negative")
+    if (start or 0) >= num_frames:
+        raise ValueError(f"Invalid range {text}, starts after the last frame "
+            f"(the video has {num_frames} frames)")
+    if end is not None and end <= (start or 0):
+        raise ValueError(f"Invalid range {text}, contains no frames")
+
+    return slice(start, end)
+
+
+def join_segments(scene, segments: Sequence[Path], out: str, cache: Path,
+        window: Optional[slice] = None, stride: int = 1) -> None:
     """
-    real_start = None  # Remove later
+    Join videos rendered separately with ``--frames`` or ``--seconds``,
+    without re-encoding, and add audio to the whole.
 
+    :param segments: Videos in order, each starting where the previous ends.
+    :param window: Frames the segments cover, to offset the audio.
+        Defaults to starting at the first frame of the video.
+    """
     props = scene.default
-    video = Video(cache / "output")
-    render_frames(scene, libs, video, cache, real_start)
-    video.compile(out, props)
+    video = Video(cache / "output", props, stride=stride)
+
+    for path in segments:
+        vid = cv2.VideoCapture(str(path))
+        video.frame += int(vid.get(cv2.CAP_PROP_FRAME_COUNT))
+        vid.release()
+
+    start = 0 if window is None or window.start is None else window.start
+    video.compile(out, props, segments, start)
+
+
+def apply_draft(scene, scale: float) -> None:
+    """
+    Scale the scene's resolution for a draft render. Everything else sized
+    in pixels (e.g. props with the ``Coords`` modifier, keyboard crop,
+    blocks) derives from the resolution, so it scales along.
+    """
+    width, height = scene.default.video.resolution
+    # Even dimensions are required by yuv420p.
+    res = [max(2, round(v * scale / 2) * 2) for v in (width, height)]
+    scene.video.resolution = res
+    logger.info(f"Draft resolution {res[0]}x{res[1]}")
 
 
 def get_frame_bounds(props, duration):
@@ -101,56 +201,601 @@ def get_frame_bounds(props, duration):
     return (frame_start, frame_end)
 
 
-def render_frames(scene, libs, video, cache, real_start=None) -> int:
+def video_bounds(props, notes) -> Tuple[int, int]:
     """
-    Render frames.
+    Integer ``(start_frame, end_frame)`` of the whole video.
 
-    :param real_start: Frame to start rendering from.
-    :return: Number of frames rendered.
+    :param notes: Parsed MIDI notes.
     """
-    # Parse MIDI.
-    notes = parse_midi(scene.default)
-    duration = int(max(x.end for x in notes))
+    duration = int(notes["end"].max())
+    frame_start, frame_end = get_frame_bounds(props, duration)
+    return int(frame_start), int(frame_end)
 
-    # Calculate start and end.
-    frame_start, frame_end = get_frame_bounds(scene.default, duration)
 
-    # OOP effects
-    props = scene.default
-    blocks = Blocks(props, cache, libs, notes)
-    keyboard = Keyboard(props, cache, libs, notes)
-    #glare = Glare(props, cache, libs, notes)
-    #ptcls = Particles(props, cache, libs)
-
-    # Adjust start to match previous render
-    if real_start is None:
-        real_start = frame_start
-    frame_start, frame_end, real_start = map(int,
-        (frame_start, frame_end, real_start))
-    logger.info(f"Starting render from frame {real_start}")
-
-    # Render
-    num_frames = real_start - frame_start
-    video.frame = num_frames
-    for frame in trange(real_start, frame_end, desc="Rendering"):
-        # Save state
-        num_frames += 1
-        with open(cache/"currently_rendering.txt", "w") as fp:
-            fp.write(str(frame))
+def video_frames(scene, cache: Path, stride: int = 1) -> int:
+    """
+    Number of frames of the whole video, like ``FrameRenderer.num_frames``.
+    """
+    bounds = video_bounds(scene.default, parse_midi(scene.default, cache))
+    return len(range(*bounds, stride))
+
+
+class FrameRenderer:
+    """
+    Renders individual frames of a scene.
+
+    Holds the effects, which keep state (e.g. the keyboard video reader),
+    so every process that renders frames needs its own instance.
+    """
+
+    def __init__(self, scene, cache: Path, libs, notes, frame_start: int,
+            frame_end: int, frame_cache: Optional[FrameCache] = None,
+            stride: int = 1, precision: str = "float64",
+            check_precision: bool = False,
+            profiler: Optional[Profiler] = None,
+            threads: Optional[int] = None) -> None:
+        """
+        :param frame_start, frame_end: Bounds of the whole video, used for
+            the fade.
+        :param frame_cache: Reuse frames from and store frames to this cache.
+        :param stride: Only every ``stride`` th frame is part of the video.
+        :param precision: Dtype of the raw image, ``float64`` or ``float32``.
+        :param check_precision: Also render each frame in float64 and track
+            the max difference in ``max_diff``.
+        :param profiler: Record the time of each stage here.
+        :param threads: Number of threads of the C kernels in each frame,
+            0 for all cores. Defaults to the ``video.threads`` prop.
+        """
+        self.scene = scene
+        self.timeline = bake_props(scene, cache, frame_start, frame_end)
+        self.cache = cache
+        self.libs = libs
+        self.notes = notes
+        self.frame_start = frame_start
+        self.frame_end = frame_end
+        self.frame_cache = frame_cache
+        self.stride = stride
+        self.precision = precision
+        self.check_precision = check_precision
+        self.cached = 0
+        self.repeated = 0
+        self._last = (None, None)  # (Key, frame) of the last prepared frame
+        self.max_diff = (0, None)  # (Pixel difference, frame)
+        self.profiler = Profiler(False) if profiler is None else profiler
+        if threads is None:
+            threads = scene.default.video.threads
+        self.threads = threads or os.cpu_count()
+
+        self._notes = np.column_stack([notes[k].astype(np.float64)
+            for k in ("start", "end", "note", "velocity")]).reshape(-1, 4)
+
+        props = scene.default
+        self.blocks = Blocks(props, cache, libs, notes)
+        self.keyboard = Keyboard(props, cache, libs, notes)
+        #self.glare = Glare(props, cache, libs, notes)
+        #self.ptcls = Particles(props, cache, libs)
+
+        self.effects = [self.blocks, self.keyboard]
+
+        # Checked and logged once, before forking workers.
+        tone_lut(props.comp.tone_curve)
+
+        self.pool = BufferPool()
+        for effect in self.effects:
+            effect.pool = self.pool
+            effect.threads = self.threads
+
+    @property
+    def num_frames(self) -> int:
+        """
+        Number of frames in the video.
+        """
+        return len(range(self.frame_start, self.frame_end, self.stride))
+
+    def frame_of(self, index: int) -> int:
+        """
+        Scene frame of a video frame index.
+        """
+        return self.frame_start + index*self.stride
+
+    def index_of(self, frame: int) -> int:
+        """
+        Video frame index of a scene frame.
+        """
+        return (frame-self.frame_start) // self.stride
+
+    @property
+    def stateful(self) -> bool:
+        """
+        Whether any effect depends on previous frames.
+        See ``Effect.stateful``.
+        """
+        return any(e.stateful for e in self.effects)
+
+    def visible_notes(self, props, frame: int) -> np.ndarray:
+        """
+        Notes whose blocks may be visible, as rows of
+        ``(frame-start, frame-end, note, velocity)``.
+
+        Mirrors the culling in ``render_blocks``, with a margin of one pixel.
+        """
+        half = props.video.resolution[1] // 2
+        speed = props.blocks.speed * half / props.video.fps
+
+        notes = self._notes
+        if speed != 0:
+            # Only notes between the frames at the top and bottom of the
+            # blocks area (plus the margin) can be visible. Look them up in
+            # the blocks' index, like NoteIndex in pr_midi.hpp.
+            top = frame + half/speed
+            margin = 1 + 1/abs(speed)
+            lo = min(frame, top) - margin
+            hi = max(frame, top) + margin
+            blocks = self.blocks
+            last = np.searchsorted(blocks.index_starts, hi, side="right")
+            first = np.searchsorted(blocks.index_max_ends[:last], lo)
+            notes = notes[np.sort(blocks.index_order[first:last])]
+
+        notes = notes.copy()
+        notes[:, :2] = frame - notes[:, :2]
+        y_start = half + speed*notes[:, 0]
+        y_end = half + speed*notes[:, 1]
+        y_up = np.minimum(y_start, y_end)
+        y_down = np.maximum(y_start, y_end)
+
+        visible = (y_down >= -1) & (y_up <= half+1)
+        return notes[visible]
+
+    def frame_key(self, props, frame: int) -> Optional[str]:
+        """
+        Hash of everything that determines the image of this frame.
+        Doesn't include the frame number itself, so identical frames at
+        different times have the same key.
+
+        :return: Key, or None if the keyboard video frame isn't known
+            before reading it. Then the frame is neither cached nor repeated.
+        """
+        source = self.keyboard.source_index(frame)
+        if source is None:
+            return None
+
+        fade = fade_factor(self.scene.default, self.frame_start,
+            self.frame_end, frame)
+        values = (
+            props._as_dict(),
+            self.visible_notes(props, frame),
+            source,
+            fade,
+            self.precision,
+        )
+
+        if self.frame_cache is not None:
+            return self.frame_cache.key(*values)
+        hasher = hashlib.sha1()
+        hash_value(hasher, values)
+        return hasher.hexdigest()
+
+    def restart(self) -> None:
+        """
+        Don't repeat the last prepared frame, e.g. when starting a new
+        video. See ``prepare``.
+        """
+        self._last = (None, None)
+
+    def prepare(self, frame: int) -> "FrameJob":
+        """
+        First step of rendering a frame: evaluate props, look up the frame
+        cache, and read the keyboard video if needed.
+        Frames must be prepared in increasing order.
+
+        If the frame's key is the same as the previous frame's (e.g. in the
+        margins and rests), it is marked as a repeat and nothing else is
+        done. Not for scenes with stateful effects.
+        """
+        prof = self.profiler
+        with prof.span("props", frame):
+            job = FrameJob(frame, self.timeline.values(frame))
+
+        if self.frame_cache is not None or not self.stateful:
+            with prof.span("key", frame):
+                job.key = self.frame_key(job.props, frame)
+
+        if not self.stateful:
+            job.repeat = (job.key is not None
+                and self._last == (job.key, frame-self.stride))
+            self._last = (job.key, frame)
+        if job.repeat:
+            return job
+
+        if self.frame_cache is not None and job.key is not None:
+            with prof.span("cache_get", frame):
+                job.img = self.frame_cache.get(job.key)
+
+        if job.img is None:
+            with prof.span("decode", frame):
+                job.kbd = self.keyboard.read(frame)
+
+        return job
+
+    def draw(self, job: "FrameJob") -> np.ndarray:
+        """
+        Second step of rendering a frame: apply effects and composite.
+
+        :return: uint8 image of shape ``(height, width, 3)``. Give it back
+            with ``release`` when done. None if the frame is a repeat of
+            the previous frame.
+        """
+        if job.repeat:
+            self.repeated += 1
+            return None
+        if job.img is not None:
+            self.cached += 1
+            return job.img
+
+        img = self._draw(job, self.precision)
+
+        if self.check_precision and self.precision != "float64":
+            ref = self._draw(job, "float64")
+            diff = int(np.max(cv2.absdiff(img, ref)))
+            self.pool.give(ref)
+            if diff > self.max_diff[0]:
+                self.max_diff = (diff, job.frame)
+
+        if self.frame_cache is not None and job.key is not None:
+            with self.profiler.span("cache_put", job.frame):
+                self.frame_cache.put(job.key, img)
+
+        return img
+
+    def _draw(self, job: "FrameJob", precision: str) -> np.ndarray:
+        """
+        Draw with the raw image in this precision.
+        """
+        frame = job.frame
+        props = job.props
+        prof = self.profiler
 
         # Create image
-        shape = (*scene.default.video.resolution[::-1], 3)
-        raw_img = np.zeros(shape, dtype=np.float64)
+        shape = (*self.scene.default.video.resolution[::-1], 3)
+        raw_img = self.pool.take(shape, precision, zero=True)
 
         # Apply effects
-        props = scene.values(frame)
-        blocks.render(props, raw_img, frame)
-        #ptcls.render(props, img, frame, notes)
-        #glare.render(props, img, frame, notes)
+        with prof.span("blocks", frame):
+            self.blocks.render(props, raw_img, frame)
+        #self.ptcls.render(props, img, frame, notes)
+        #self.glare.render(props, img, frame, notes)
 
         # Compositing
-        img = composite(libs, props, raw_img)
-        keyboard.render(props, img, frame)
-        add_fade(scene.default, img, frame_start, frame_end, frame)
+        with prof.span("composite", frame):
+            img = composite(self.libs, props, raw_img,
+                out=self.pool.take(shape, np.uint8), threads=self.threads)
+        self.pool.give(raw_img)
+        with prof.span("keyboard", frame):
+            self.keyboard.render(props, img, frame, job.kbd)
+        with prof.span("fade", frame):
+            add_fade(self.scene.default, img, self.frame_start,
+                self.frame_end, frame)
+
+        return img
+
+    def render(self, frame: int) -> np.ndarray:
+        """
+        Render one frame.
+        Frames must be rendered in increasing order.
+
+        :return: uint8 image of shape ``(height, width, 3)``, or None if
+            the frame is a repeat of the previous frame.
+        """
+        return self.draw(self.prepare(frame))
+
+    def release(self, img: np.ndarray) -> None:
+        """
+        Reuse the buffer of a rendered image for a later frame.
+        """
+        self.pool.give(img)
+
+
+class FrameJob:
+    """
+    State of a frame between the steps of ``FrameRenderer``.
+    """
+    frame: int
+    props: Accessor
+    key: Optional[str]
+    repeat: bool
+    kbd: Optional[np.ndarray]
+    img: Optional[np.ndarray]
+
+    def __init__(self, frame: int, props: Accessor) -> None:
+        self.frame = frame
+        self.props = props
+        self.key = None
+        self.repeat = False
+        self.kbd = None
+        self.img = None
+
+
+def bake_props(scene, cache: Path, frame_start: int,
+        frame_end: int) -> Timeline:
+    """
+    Bake the scene's animated props over the video, or load them from the
+    cache if they were baked before (e.g. by the main process, for worker
+    processes).
+    """
+    path = cache / "timeline.npz"
+    timeline = Timeline.load(scene, path, frame_start, frame_end)
+    if timeline is None:
+        timeline = scene.bake(frame_start, frame_end)
+        timeline.save(path)
+    return timeline
 
-        video.write(img)
+
+# Renderer of the current worker process, see ``render_parallel``.
+_worker_renderer = None
+
+def _init_worker(scene, cache, notes, frame_start, frame_end, frame_cache,
+        stride, precision, check_precision, profile, threads):
+    """
+    Pool initializer. Loads the already built libraries and creates
+    this worker's own effects.
+    """
+    global _worker_renderer
+    libs = load_libs(cache, build=False)
+    _worker_renderer = FrameRenderer(scene, cache, libs, notes,
+        frame_start, frame_end, frame_cache, stride, precision,
+        check_precision, Profiler(profile), threads)
+
+def _render_chunk(chunk):
+    """
+    Render a list of frames in a worker process.
+
+    :return: ``(images, number of frames taken from the frame cache,
+        number of repeated frames, max_diff of the worker, profiler spans)``
+    """
+    renderer = _worker_renderer
+    cached, repeated = renderer.cached, renderer.repeated
+    imgs = [renderer.render(f) for f in chunk]
+    return (imgs, renderer.cached - cached, renderer.repeated - repeated,
+        renderer.max_diff, renderer.profiler.take())
+
+
+def render_parallel(renderer, frames, jobs):
+    """
+    Render frames in ``jobs`` worker processes.
+
+    The frames are split into chunks of one second. Chunks are handed
+    out in order, so each worker sees increasing frames and can read the
+    keyboard video monotonically.
+
+    Workers render each frame with one thread: the processes already use
+    the cores, and OpenMP deadlocks in forked processes if the main
+    process used several threads.
+
+    :param renderer: The main process's renderer. Its settings except
+        ``threads`` are copied to the workers, and its ``cached``,
+        ``repeated``, ``max_diff`` and profiler are updated.
+    :return: Generator of images (None for repeats), in frame order.
+    """
+    fps = renderer.scene.default.video.fps
+    chunks = [frames[i:i+fps] for i in range(0, len(frames), fps)]
+
+    ctx = multiprocessing.get_context("fork")
+    initargs = (renderer.scene, renderer.cache, renderer.notes,
+        renderer.frame_start, renderer.frame_end, renderer.frame_cache,
+        renderer.stride, renderer.precision, renderer.check_precision,
+        renderer.profiler.enabled, 1)
+    with ctx.Pool(jobs, _init_worker, initargs) as pool:
+        for imgs, cached, repeated, max_diff, spans in \
+                pool.imap(_render_chunk, chunks):
+            renderer.cached += cached
+            renderer.repeated += repeated
+            renderer.max_diff = max(renderer.max_diff, max_diff,
+                key=lambda d: d[0])
+            renderer.profiler.merge(spans)
+            yield from imgs
+
+
+def create_renderer(scene, cache, libs,
+        frame_cache: Optional[FrameCache] = None, stride: int = 1,
+        precision: str = "float64", check_precision: bool = False,
+        profiler: Optional[Profiler] = None,
+        threads: Optional[int] = None) -> FrameRenderer:
+    """
+    Parse MIDI and create a renderer for the whole video.
+    See ``FrameRenderer`` for the parameters.
+    """
+    notes = parse_midi(scene.default, cache)
+    frame_start, frame_end = video_bounds(scene.default, notes)
+
+    return FrameRenderer(scene, cache, libs, notes, frame_start, frame_end,
+        frame_cache, stride, precision, check_precision, profiler, threads)
+
+
+def write_frames(renderer, video, frames, jobs: int = 1,
+        journal: Optional[Journal] = None, offset: int = 0) -> None:
+    """
+    Render frames and write them to the video in order.
+
+    In one process, decoding the keyboard video, drawing, and encoding run
+    in separate threads (see ``Pipeline``). With more processes, frames are
+    drawn in the workers and encoded in a thread of this process.
+
+    :param frames: Increasing frame numbers to render.
+    :param jobs: Number of worker processes. Falls back to 1 if any effect
+        is stateful.
+    :param journal: Record finished frames here. Must be opened.
+    :param offset: Video frame index of ``video``'s first frame.
+    """
+    last = None  # Last written image, kept for repeats
+
+    def write(item):
+        nonlocal last
+        frame, img = item
+        index = renderer.index_of(frame) - offset
+        with renderer.profiler.span("encode", frame):
+            if img is None:
+                video.write(last, index, repeat=True)
+            else:
+                video.write(img, index)
+                if last is not None:
+                    renderer.release(last)
+                last = img
+        if journal is not None:
+            journal.add(index)
+
+    renderer.restart()
+
+    if jobs > 1 and renderer.stateful:
+        logger.warn("Scene has stateful effects, rendering in one process.")
+        jobs = 1
+
+    if jobs > 1:
+        logger.info(f"Rendering with {jobs} processes, one thread each.")
+        imgs = render_parallel(renderer, frames, jobs)
+        pipeline = Pipeline(zip(frames, imgs), [("encode", write)])
+    else:
+        pipeline = Pipeline(frames, [
+            ("decode", renderer.prepare),
+            ("draw", lambda job: (job.frame, renderer.draw(job))),
+            ("encode", write),
+        ])
+
+    with tqdm(total=len(frames), desc="Rendering") as pbar:
+        for _ in pipeline:
+            pbar.set_postfix_str(pipeline.depths(), refresh=False)
+            pbar.update()
+
+    depths = ", ".join(f"{name} {avg:.1f}/{peak}"
+        for name, avg, peak in pipeline.report())
+    if depths:
+        logger.info(f"Queue depths before stages (avg/max of "
+            f"{pipeline.depth}): {depths}")
+    logger.info(f"Buffer pool: {renderer.pool.stats()}")
+
+    if renderer.check_precision and renderer.precision != "float64":
+        diff, frame = renderer.max_diff
+        where = "" if frame is None else f" (frame {frame})"
+        logger.info(f"Max pixel difference of {renderer.precision} from "
+            f"float64: {diff}/255{where}")
+
+
+def render_frames(scene, libs, video, cache, done: Set[int] = frozenset(),
+        jobs: int = 1, frame_cache: Optional[FrameCache] = None,
+        journal: Optional[Journal] = None, stride: int = 1,
+        precision: str = "float64", check_precision: bool = False,
+        profile: Optional[Path] = None,
+        window: Optional[slice] = None,
+        threads: Optional[int] = None) -> range:
+    """
+    Render frames.
+
+    :param done: Indices (0 is the first rendered frame) of frames
+        finished by a previous render. These are skipped.
+    :param jobs: Number of worker processes. See ``write_frames``.
+    :param frame_cache: Reuse unchanged frames from previous renders.
+    :param journal: Record finished frames here. Kept if ``done`` is given,
+        cleared otherwise.
+    :param stride: Render every ``stride`` th frame, for drafts.
+    :param precision, check_precision: See ``FrameRenderer``.
+    :param profile: Time each stage and save a trace here, see ``Profiler``.
+    :param window: Only render these video frame indices, e.g.
+        ``slice(300, 600)``. They are written to ``video`` from index 0.
+    :param threads: Threads of the C kernels, see ``FrameRenderer``.
+    :return: Video frame indices that were rendered.
+    """
+    profiler = Profiler(profile is not None)
+    renderer = create_renderer(scene, cache, libs, frame_cache, stride,
+        precision, check_precision, profiler, threads)
+    indices = range(renderer.num_frames)
+    if window is not None:
+        indices = indices[window]
+        logger.info(f"Rendering video frames {indices.start} to "
+            f"{indices.stop} of {renderer.num_frames}.")
+
+    frames = [renderer.frame_of(i) for i in indices
+        if i-indices.start not in done]
+    if done:
+        logger.info(f"Skipping {len(done)} frames finished previously.")
+
+    if journal is not None:
+        journal.open(resume=bool(done))
+    try:
+        write_frames(renderer, video, frames, jobs, journal, indices.start)
+    finally:
+        if journal is not None:
+            journal.close()
+    video.frame = len(indices)
+
+    if frame_cache is not None:
+        logger.info(f"Reused {renderer.cached} frames from frame cache.")
+        frame_cache.evict()
+    logger.info(f"Repeated {renderer.repeated} frames identical to the "
+        "previous frame.")
+    if profile is not None:
+        profiler.save(profile)
+
+    return indices
+
+
+def render_farm(args, scene, out: str, cache: Path, libs,
+        frame_cache: Optional[FrameCache] = None, stride: int = 1) -> None:
+    """
+    Render as one node of a render farm, see ``Farm``.
+
+    Claims and renders chunks until all are finished, encoding each to a
+    segment. Afterwards, one node joins the segments and adds audio.
+    """
+    props = scene.default
+    preset = "ultrafast" if args.draft else None
+    farm = Farm(args.farm, scene_fingerprint(scene, stride, args.precision),
+        args.farm_lease)
+    profiler = Profiler(args.profile is not None)
+    renderer = create_renderer(scene, cache, libs, frame_cache, stride,
+        args.precision, args.check_precision, profiler, args.threads)
+    num_frames = renderer.num_frames
+    farm.setup(num_frames,
+        max(1, int(args.farm_chunk * props.video.fps / stride)))
+
+    next_frame = renderer.frame_start
+    while not farm.finished():
+        chunk = farm.claim()
+        if chunk is None:
+            # Wait for other nodes, or for their leases to expire.
+            time.sleep(min(5, farm.lease_time/4))
+            continue
+
+        frames = [renderer.frame_of(i) for i in farm.chunk_range(chunk)]
+        if frames[0] < next_frame:
+            # Effects only render forward.
+            renderer = create_renderer(scene, cache, libs, frame_cache, stride,
+                args.precision, args.check_precision, profiler, args.threads)
+
+        logger.info(f"Rendering chunk {chunk+1} of {farm.num_chunks}")
+        video = Video(farm.work / "segment", props, encoders=args.encoders,
+            stride=stride, preset=preset)
+        write_frames(renderer, video, frames, args.jobs,
+            offset=renderer.index_of(frames[0]))
+        farm.complete(chunk, video.finish())
+        next_frame = frames[-1] + 1
+
+    logger.info(f"Repeated {renderer.repeated} frames identical to the "
+        "previous frame.")
+    if args.profile is not None:
+        profiler.save(args.profile)
+
+    # Wait until joined, and take over if the joining node crashes.
+    waiting = False
+    while not farm.joined():
+        if farm.claim_join():
+            # Only joins, so no encoders and no segments directory.
+            video = Video(cache / "output", props, stride=stride)
+            video.frame = num_frames
+            video.compile(out, props, farm.segments())
+            farm.release_join()
+            break
+
+        if not waiting:
+            logger.info("All chunks finished. Waiting for another node to "
+                "join the segments.")
+            waiting = True
+        time.sleep(min(5, farm.lease_time/4))
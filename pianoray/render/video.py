@@ -4,9 +4,11 @@ Video writer.
 
 import os
 import shutil
+from fractions import Fraction
 from pathlib import Path
-from subprocess import Popen, PIPE
-from typing import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import DEVNULL, Popen, PIPE
+from typing import List, Optional, Sequence
 
 import cv2
 import numpy as np
@@ -15,71 +17,317 @@ from .. import logger
 from ..utils import FFMPEG
 
 
+class Encoder:
+    """
+    FFmpeg process encoding raw frames written to its stdin.
+    """
+
+    def __init__(self, args: Sequence[str], log: Path) -> None:
+        """
+        :param args: FFmpeg command.
+        :param log: Path to write FFmpeg's output to.
+        """
+        self.log = log
+        self._log = open(log, "wb")
+        self._proc = Popen(list(map(str, args)), stdin=PIPE, stdout=DEVNULL,
+            stderr=self._log)
+
+    def write(self, img: np.ndarray) -> None:
+        """
+        Write a frame. Blocks while FFmpeg's input pipe is full.
+        """
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(img).data)
+        except BrokenPipeError:
+            self.wait()
+            raise
+
+    def close(self) -> None:
+        """
+        Signal end of input. FFmpeg keeps encoding the remaining frames.
+        """
+        self._proc.stdin.close()
+
+    def wait(self) -> None:
+        """
+        Wait for FFmpeg to exit and raise if it failed.
+        """
+        self._proc.wait()
+        self._log.close()
+
+        if self._proc.returncode != 0:
+            msg = f"FFmpeg exited with code {self._proc.returncode}. " + \
+                f"See log at {self.log}"
+            raise ValueError(msg)
+
+
 class Video:
     """
     Video.
 
-    Saves frames to given cache directory and uses ffmpeg to make the
-    final video.
+    By default, frames are streamed as raw RGB to an FFmpeg process which
+    encodes them while rendering. Writes block while FFmpeg is busy, so
+    rendering never gets ahead of encoding.
+
+    With ``save_frames``, frames are instead saved as JPEGs to the cache
+    directory, and encoded in ``compile``. This is slower, but the frames
+    stay on disk, which allows resuming a render.
+
+    Keyframes are at most ``gop`` frames (5 seconds) apart, with any number
+    of encoders. With more than one encoder, the video is encoded as
+    segments, several at a time, which are joined without re-encoding.
+    Segments are whole GOPs (groups of pictures) of ``gop`` frames, except
+    the last, so each starts at a multiple of ``gop``. The encoder may add
+    keyframes at scene cuts, which can differ between numbers of encoders.
     """
 
-    def __init__(self, cache: Path) -> None:
+    def __init__(self, cache: Path, props, save_frames: bool = False,
+            encoders: int = 1, stride: int = 1, preset: Optional[str] = None
+            ) -> None:
         """
         Initializes video.
 
-        :param cache: Cache directory. Frames stored there.
+        :param cache: Cache directory. Frames and intermediate files
+            stored there.
+        :param props: Scene default props, for video settings.
+        :param save_frames: Save frames to the cache instead of streaming.
+        :param encoders: Max number of concurrent FFmpeg encoders.
+        :param stride: Every ``stride`` th frame of the scene is rendered.
+            The video's frame rate is divided by this.
+        :param preset: Encoder preset passed to FFmpeg, e.g. ``ultrafast``.
         """
         self.cache = cache
+        self.props = props
+        self.save_frames = save_frames
+        self.encoders = encoders
+        self.preset = preset
+        self.fps = Fraction(props.video.fps, stride)
+        self.gop = max(round(5 * self.fps), 1)
         self.frame = 0
 
-        (self.cache/"frames").mkdir(parents=True, exist_ok=True)
+        self._bgr = None  # Reused for converting saved frames
+        self._last_path = None  # Last saved frame
+        self._stream = None
+        self._stream_frames = 0
+        self._running = []
+        self._segments = []
+
+        self.cache.mkdir(parents=True, exist_ok=True)
+        if save_frames:
+            (self.cache/"frames").mkdir(exist_ok=True)
+        if encoders > 1:
+            shutil.rmtree(self.cache/"segments", ignore_errors=True)
+            (self.cache/"segments").mkdir()
+
+    def frame_path(self, index: int) -> Path:
+        """
+        Path of a saved frame.
+        """
+        return frame_path(self.cache, index)
 
-    def write(self, img: np.ndarray) -> int:
+    def write(self, img: np.ndarray, index: Optional[int] = None,
+            repeat: bool = False) -> int:
         """
         Write a frame.
-        Converts from RGB to BGR.
 
-        :param img: Frame of shape ``(height, width, 3)``
+        :param img: RGB frame of shape ``(height, width, 3)``
+        :param index: Frame number. Defaults to after the last frame. Frames
+            can only be written out of order with ``save_frames``.
+        :param repeat: ``img`` is the last written frame. With
+            ``save_frames``, the saved file is linked instead of encoded
+            again.
         :return: This frame number.
         """
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        path = str(self.cache / "frames" / f"{self.frame}.jpg")
-        cv2.imwrite(path, img)
+        if index is None:
+            index = self.frame
 
-        self.frame += 1
-        return self.frame - 1
+        if self.save_frames:
+            path = self.frame_path(index)
+            # May be a link to another frame.
+            path.unlink(missing_ok=True)
+            if repeat and self._last_path is not None:
+                try:
+                    os.link(self._last_path, path)
+                except OSError:
+                    shutil.copyfile(self._last_path, path)
+            else:
+                self._bgr = cv2.cvtColor(img, cv2.COLOR_RGB2BGR, dst=self._bgr)
+                cv2.imwrite(str(path), self._bgr)
+            self._last_path = path
+        else:
+            assert index == self.frame, "Streamed frames must be in order."
+            if self._stream is None or (self.encoders > 1
+                    and self._stream_frames == 2*self.gop):
+                self._next_stream(img.shape[1], img.shape[0])
+            self._stream.write(img)
+            self._stream_frames += 1
+
+        self.frame = max(self.frame, index+1)
+        return index
 
-    def compile(self, out: str, props) -> None:
+    def _encode_args(self, inputs: Sequence, output: Path) -> List:
         """
-        Use ffmpeg to compile frames and audio to video.
+        FFmpeg command to encode video.
 
-        :param out: Output video path.
+        :param inputs: Input arguments.
         """
-        # Frames to video
-        logger.info("Compiling frames to video.")
+        props = self.props
         args = [
             FFMPEG,
             "-y",
-            "-r", props.video.fps,
-            "-start_number", 0,
-            "-i", self.cache / "frames" / "%d.jpg",
-            "-vframes", self.frame,
+            *inputs,
             "-c:v", props.video.vcodec, "-an",
             "-crf", 24,
-            "-r", props.video.fps,
-            self.cache / "no_audio.mp4",
+            "-r", self.fps,
+        ]
+        if self.preset is not None:
+            args.extend(["-preset", self.preset])
+        args.extend(["-g", self.gop])
+        args.append(output)
+
+        return args
+
+    def _segment_path(self, i: int) -> Path:
+        return self.cache / "segments" / f"{i}.mp4"
+
+    def _next_stream(self, width: int, height: int) -> None:
+        """
+        Start the FFmpeg encoder for the next segment, reading raw frames
+        from stdin. Waits if ``encoders`` are already running.
+        """
+        if self._stream is not None:
+            self._stream.close()
+            self._running.append(self._stream)
+        while len(self._running) >= self.encoders:
+            self._running.pop(0).wait()
+
+        if self.encoders > 1:
+            path = self._segment_path(len(self._segments))
+            log = path.with_suffix(".log")
+            self._segments.append(path)
+        else:
+            path = self.cache / "no_audio.mp4"
+            log = self.cache / "ffmpeg.log"
+
+        inputs = [
+            "-f", "rawvideo",
+            "-pix_fmt", "rgb24",
+            "-s", f"{width}x{height}",
+            "-r", self.fps,
+            "-i", "-",
+            "-pix_fmt", "yuv420p",
+        ]
+        self._stream = Encoder(self._encode_args(inputs, path), log)
+        self._stream_frames = 0
+
+    def _encode_frames(self, start: int, count: int, output: Path) -> None:
+        """
+        Encode saved frames ``start`` to ``start+count``.
+        """
+        inputs = [
+            "-r", self.fps,
+            "-start_number", start,
+            "-i", self.cache / "frames" / "%d.jpg",
+            "-vframes", count,
+        ]
+        run_ffmpeg(self._encode_args(inputs, output))
+
+    def _concat(self, segments: Sequence[Path], output: Path) -> None:
+        """
+        Join videos with the FFmpeg concat demuxer, without re-encoding.
+        """
+        concat_list = self.cache / "segments.txt"
+        with open(concat_list, "w") as fp:
+            for path in segments:
+                fp.write(f"file '{Path(path).absolute()}'\n")
+
+        args = [
+            FFMPEG,
+            "-y",
+            "-f", "concat",
+            "-safe", 0,
+            "-i", concat_list,
+            "-c", "copy",
+            "-an",
+            output,
         ]
         run_ffmpeg(args)
 
+    def finish(self) -> Path:
+        """
+        Finish encoding the video, without audio.
+
+        :return: Path of the encoded video.
+        """
+        output = self.cache / "no_audio.mp4"
+
+        if self.save_frames:
+            logger.info("Compiling frames to video.")
+            if self.encoders > 1:
+                # Split into segments of equal whole GOPs, the last shorter.
+                gops = -(-self.frame // self.gop)
+                length = -(-gops // self.encoders) * self.gop
+                starts = range(0, self.frame, length)
+                segments = [self._segment_path(i) for i in range(len(starts))]
+
+                with ThreadPoolExecutor(self.encoders) as pool:
+                    jobs = [pool.submit(self._encode_frames, start,
+                        min(length, self.frame-start), path)
+                        for start, path in zip(starts, segments)]
+                    for job in jobs:
+                        job.result()
+                self._concat(segments, output)
+
+            else:
+                self._encode_frames(0, self.frame, output)
+
+        elif self._stream is not None:
+            logger.info("Waiting for encoder to finish.")
+            self._stream.close()
+            self._running.append(self._stream)
+            self._stream = None
+            for encoder in self._running:
+                encoder.wait()
+            self._running = []
+
+            if self._segments:
+                self._concat(self._segments, output)
+
+        return output
+
+    def compile(self, out: str, props,
+            segments: Optional[Sequence[Path]] = None,
+            start: int = 0) -> None:
+        """
+        Finish encoding the video and add audio.
+
+        :param out: Output video path.
+        :param segments: Join these separately encoded videos with the
+            FFmpeg concat demuxer, instead of encoding frames written
+            to this video. Set ``self.frame`` to the total frame count.
+        :param start: Frame of the whole video this video starts at. Audio
+            is cut from there.
+        """
+        # Frames to video
+        if segments is None:
+            self.finish()
+        else:
+            logger.info(f"Joining {len(segments)} segments.")
+            self._concat(segments, self.cache / "no_audio.mp4")
+
         if props.audio.file is not None:
-            # Cut audio
+            # Cut audio. Before its start (e.g. in the start margin) and
+            # after its end, it's padded with silence.
             logger.info("Processing audio.")
+            offset = props.audio.start - props.comp.margin_start \
+                + float(start / self.fps)
             args = [
                 FFMPEG,
                 "-y",
-                "-ss", props.audio.start - props.comp.margin_start,
-                "-t", self.frame / props.video.fps,
+                "-ss", max(offset, 0),
                 "-i", props.audio.file,
+                "-af", f"adelay={round(max(-offset, 0) * 1000)}:all=1,apad",
+                "-t", float(self.frame / self.fps),
                 self.cache / "offset.mp3",
             ]
             run_ffmpeg(args)
@@ -104,6 +352,13 @@ class Video:
         logger.info(f"Video saved to {out}")
 
 
+def frame_path(cache: Path, index: int) -> Path:
+    """
+    Path of a frame saved by a ``Video`` with ``save_frames`` in ``cache``.
+    """
+    return cache / "frames" / f"{index}.jpg"
+
+
 def run_ffmpeg(args: Sequence[str]):
     args = list(map(str, args))
     proc = Popen(args, stdin=PIPE, stdout=PIPE, stderr=PIPE)
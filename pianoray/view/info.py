@@ -4,8 +4,6 @@ from .timeline import Timeline
 from .utils import *
 from .video import Video
 
-pygame.init()
-
 
 class Info:
     """
@@ -33,5 +31,5 @@ class Info:
         x = rect[0] + 20
         for i, t in enumerate(text):
             y = rect[1] + 10 + 20*i
-            surf = FONT_MED.render(t, True, WHITE)
+            surf = font_med().render(t, True, WHITE)
             surface.blit(surf, (x, y))
@@ -5,8 +5,6 @@ from .timeline import Timeline
 from .utils import *
 from .video import Video
 
-pygame.init()
-
 
 class Preview:
     """
@@ -5,8 +5,6 @@ from ..utils import bounds
 from .utils import *
 from .video import Video
 
-pygame.init()
-
 
 class Timeline:
     """
@@ -1,8 +1,8 @@
+from functools import lru_cache
+
 import numpy as np
 import pygame
 
-pygame.init()
-
 TMP = "/tmp"
 
 BLACK = np.array((0, 0, 0))
@@ -12,4 +12,10 @@ LIGHT_GRAY = np.array((170, 170, 170))
 WHITE = np.array((255, 255, 255))
 BLUE = np.array((130, 130, 255))
 
-FONT_MED = pygame.font.SysFont("ubuntu", 18)
+
+@lru_cache(maxsize=None)
+def font_med() -> pygame.font.Font:
+    """
+    Medium font. Loaded on first use, after ``pygame.init``.
+    """
+    return pygame.font.SysFont("ubuntu", 18)
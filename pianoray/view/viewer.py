@@ -10,11 +10,10 @@ from .timeline import Timeline
 from .utils import *
 from .video import Video
 
-pygame.init()
-
 
 def view_video(path: str) -> None:
     logger.warn("Viewer is not complete yet.")
+    pygame.init()
 
     video = Video(path)
     timeline = Timeline(video)
@@ -17,9 +17,12 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
+import importlib.util
 import os
 import re
 import setuptools
+from setuptools.command.build_ext import build_ext
+from setuptools.errors import CompileError, LinkError
 
 
 with open("pianoray/utils.py", "r") as fp:
@@ -39,6 +42,50 @@ with open("README.md", "r") as fp:
 with open("requirements.txt", "r") as fp:
     requirements = fp.read().strip().split("\n")
 
+CUTILS = "pianoray/cutils"
+
+# Loaded from its file, as importing pianoray needs its requirements.
+spec = importlib.util.spec_from_file_location("kernel_sources",
+    "pianoray/kernel_sources.py")
+kernel_sources = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(kernel_sources)
+
+
+# C++ kernels prebuilt as one shared library, loaded with ctypes.
+# Optional: without a compiler, they are built at runtime instead.
+kernels = setuptools.Extension(
+    "pianoray._kernels",
+    sources=[f"{CUTILS}/{f}" for f in
+        ("blocks.cpp", "composite.cpp", "kernels.cpp")],
+    include_dirs=[CUTILS],
+    define_macros=[
+        ("PR_SOURCE_HASH", f'"{kernel_sources.source_hash(CUTILS)}"')],
+    extra_compile_args=["-Wall", "-Wno-unknown-pragmas", "-O3",
+        "-fno-trapping-math"],
+    language="c++",
+    optional=True,
+)
+
+
+class BuildExt(build_ext):
+    """
+    Builds the kernels with OpenMP, or without it if the compiler doesn't
+    support it (e.g. Apple clang). Then they render with one thread.
+    """
+
+    def build_extension(self, ext):
+        args = (ext.extra_compile_args, ext.extra_link_args)
+        ext.extra_compile_args = [*args[0], "-fopenmp"]
+        ext.extra_link_args = [*args[1], "-fopenmp"]
+        try:
+            super().build_extension(ext)
+        except (CompileError, LinkError):
+            self.warn("Compiler doesn't support OpenMP, building C kernels "
+                "without it.")
+            ext.extra_compile_args, ext.extra_link_args = args
+            super().build_extension(ext)
+
+
 setuptools.setup(
     name="pianoray",
     version=VERSION,
@@ -57,6 +104,8 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     include_package_data=True,
+    ext_modules=[kernels],
+    cmdclass={"build_ext": BuildExt},
     entry_points={
         "console_scripts": [
             "pianoray = pianoray.__main__:main",
@@ -0,0 +1,32 @@
+"""
+Tests of the composite C function.
+"""
+
+import numpy as np
+import pytest
+
+from pianoray.api.accessor import Accessor
+from pianoray.cpp import load_libs
+from pianoray.render.composite import composite
+
+
+@pytest.mark.parametrize("dtype", (np.float64, np.float32))
+def test_non_finite(tmp_path, dtype):
+    """
+    Infinity is the brightest color and NaN is black, instead of indexing
+    out of the tone curve table.
+    """
+    libs = load_libs(tmp_path)
+    props = Accessor({"comp": Accessor({"shutter": 1.2, "tone_curve": "tanh"})})
+    raw = np.full((4, 4, 3), 0.5, dtype=dtype)
+    raw[0, 0, 0] = np.inf
+    raw[1, 1, 1] = np.nan
+    raw[2, 2, 2] = -np.inf
+    raw[3, 3, 0] = 1e30
+
+    img = composite(libs, props, raw)
+    assert img[0, 0, 0] == 255
+    assert img[1, 1, 1] == 0
+    assert img[2, 2, 2] == 0
+    assert img[3, 3, 0] >= 254
+    assert img[0, 1, 0] == int(255 * np.tanh(0.5 * props.comp.shutter))
@@ -0,0 +1,68 @@
+"""
+Tests of building and loading the C libraries.
+"""
+
+import ctypes
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from pianoray import cpp
+from pianoray.render.composite import tone_lut
+
+
+def test_no_openmp(tmp_path, monkeypatch):
+    """
+    Compilers without OpenMP (e.g. Apple clang) build the libraries
+    without it, and they still render.
+    """
+    compiler = tmp_path / "g++"
+    compiler.write_text("#!/bin/sh\n"
+        'case " $* " in *" -fopenmp "*) echo "unsupported option '
+        "'-fopenmp'\" >&2; exit 1;; esac\n"
+        f'exec {shutil.which("g++")} "$@"\n')
+    compiler.chmod(0o755)
+    monkeypatch.setattr(cpp, "GCC", str(compiler))
+    monkeypatch.setenv("PIANORAY_JIT", "1")
+    cpp.build_flags.cache_clear()
+    cpp.compiler_version.cache_clear()
+
+    try:
+        assert "-fopenmp" not in cpp.build_flags()[0]
+        libs = cpp.load_libs(tmp_path / "cache")
+        path = cpp.lib_path(tmp_path / "cache" / "c_libs",
+            [str(cpp.CPP_UTILS / "composite.cpp")], "composite")
+        assert path.is_file()
+    finally:
+        cpp.build_flags.cache_clear()
+        cpp.compiler_version.cache_clear()
+
+    raw = np.full((4, 4, 3), 0.5)
+    img = np.empty(raw.shape, dtype=np.uint8)
+    lut = tone_lut("tanh")
+    libs["composite"].composite(raw, img, 4, 4, 1, lut, len(lut)-1, 4)
+    assert (img == int(255 * np.tanh(0.5))).all()
+
+
+def test_openmp():
+    assert "-fopenmp" in cpp.build_flags()[0]
+
+
+@pytest.mark.skipif(shutil.which("g++") is None, reason="No g++.")
+def test_extension_hash(tmp_path):
+    """
+    The hash compiled into the prebuilt kernels matches the runtime's.
+    """
+    root = cpp.ROOT.parent
+    subprocess.run([sys.executable, "setup.py", "-q", "build_ext",
+        "--build-lib", tmp_path / "lib", "--build-temp", tmp_path / "tmp"],
+        cwd=root, check=True, capture_output=True)
+
+    built = list((tmp_path / "lib" / "pianoray").glob(cpp.EXTENSION + ".*"))
+    assert len(built) == 1
+    lib = ctypes.CDLL(str(built[0]))
+    lib.pr_source_hash.restype = ctypes.c_char_p
+    assert lib.pr_source_hash().decode() == cpp.source_hash()
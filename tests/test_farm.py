@@ -0,0 +1,87 @@
+"""
+Tests of render farm leases.
+"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import pytest
+
+from pianoray.render import farm
+from pianoray.render.farm import Farm
+
+
+def test_reclaim_race(tmp_path, monkeypatch):
+    """
+    A node that saw an expired lease doesn't take it after another node
+    reclaimed it first.
+    """
+    node = Farm(tmp_path, "scene", lease_time=10)
+    lease = tmp_path / "leases" / "0"
+    lease.write_text("crashed")
+    old = time.time() - 60
+    os.utime(lease, (old, old))
+
+    rename = os.rename
+
+    def reclaim_first(src, dst):
+        # Another node reclaims the lease between our stat and rename.
+        os.unlink(lease)
+        lease.write_text("other")
+        monkeypatch.setattr(farm.os, "rename", rename)
+        rename(src, dst)
+
+    monkeypatch.setattr(farm.os, "rename", reclaim_first)
+    assert not node._try_lease(lease)
+    assert lease.read_text() == "other"
+    assert list(lease.parent.iterdir()) == [lease]
+
+
+def test_reclaim_expired(tmp_path):
+    node = Farm(tmp_path, "scene", lease_time=10)
+    lease = tmp_path / "leases" / "0"
+    lease.write_text("crashed")
+    old = time.time() - 60
+    os.utime(lease, (old, old))
+
+    assert node._try_lease(lease)
+    assert lease.read_text() == node.node
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="No FFmpeg.")
+def test_nodes(tmp_path):
+    """
+    Several processes render a video together, each chunk once.
+    """
+    root = Path(__file__).absolute().parent.parent
+    out = tmp_path / "out.mp4"
+    nodes = [subprocess.Popen([sys.executable, "-m", "pianoray", "-y",
+        "render", "tests/short.py", "Short", "-o", out,
+        "-c", tmp_path / f"cache{i}", "--farm", tmp_path / "farm",
+        "--farm-chunk", "1", "--frame-cache", "0", "--draft"],
+        cwd=root, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        for i in range(3)]
+    logs = [node.communicate()[0] for node in nodes]
+    assert [node.returncode for node in nodes] == [0, 0, 0], logs
+
+    with open(tmp_path / "farm" / "farm.json", "r") as fp:
+        info = json.load(fp)
+    num_chunks = (info["frames"] + info["chunk"] - 1) // info["chunk"]
+    rendered = [int(n) for log in logs
+        for n in re.findall(r"Rendering chunk (\d+) of", log)]
+    assert sorted(rendered) == list(range(1, num_chunks+1))
+    assert sum("Joining" in log for log in logs) == 1
+
+    video = cv2.VideoCapture(str(out))
+    frames = 0
+    while video.read()[0]:
+        frames += 1
+    video.release()
+    assert frames == info["frames"]
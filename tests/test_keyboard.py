@@ -0,0 +1,43 @@
+"""
+Tests of reading the keyboard video.
+"""
+
+import cv2
+import numpy as np
+
+from pianoray.effects.keyboard import VideoRead
+
+
+def write_video(path, frames: int) -> None:
+    """
+    Video whose frame ``i`` is filled with the value ``10*i``.
+    """
+    video = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10,
+        (16, 16))
+    for i in range(frames):
+        video.write(np.full((16, 16, 3), 10*i, dtype=np.uint8))
+    video.release()
+
+
+def test_source_index_count_too_low(tmp_path):
+    """
+    Source indices past an estimated frame count that is too low are
+    unknown, not the last estimated frame.
+    """
+    path = tmp_path / "video.avi"
+    write_video(path, 10)
+    video = VideoRead(str(path), 10, (0, 10, 0, 10))
+    video._count = 5
+
+    assert video.source_index(3) == 2
+    assert video.source_index(7) is None
+
+    # Frames read are known to exist.
+    img = video.read(7)
+    assert abs(int(img[0, 0, 0]) - 60) <= 2
+    assert video.source_index(7) == 6
+
+    # Reading past the end makes the count exact.
+    video.read(12)
+    assert video.source_index(12) == 9
+    assert video.source_index(20) == 9
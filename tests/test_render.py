@@ -0,0 +1,29 @@
+"""
+Tests of render options.
+"""
+
+from argparse import Namespace
+
+import pytest
+
+from pianoray.render.render import get_window
+
+
+def window(frames=None, seconds=None):
+    return get_window(Namespace(frames=frames, seconds=seconds), 10, 100)
+
+
+def test_window():
+    assert window() is None
+    assert window("20:50") == slice(20, 50)
+    assert window(":50") == slice(None, 50)
+    assert window("20:") == slice(20, None)
+    assert window("90:200") == slice(90, 200)
+    assert window(seconds="2:5") == slice(20, 50)
+
+
+@pytest.mark.parametrize("frames", ["50:50", "50:20", "100:", "120:130",
+    "-1:5", "a:b", "5"])
+def test_window_invalid(frames):
+    with pytest.raises(ValueError, match="Invalid range"):
+        window(frames)